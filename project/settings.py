@@ -117,6 +117,27 @@ except ImportError as e:
 # Scopus
 SCOPUS_API_KEY = os.environ.get('SCOPUS_API_KEY')
 SCOPUS_INST_TOKEN = os.environ.get('SCOPUS_INST_TOKEN')
+SCOPUS_SEARCH_MODE = os.environ.get('SCOPUS_SEARCH_MODE', 'category') # 'category' or 'single_pass'; see Search.MODES
+SCOPUS_SEARCH_CONCURRENCY = int(os.environ.get('SCOPUS_SEARCH_CONCURRENCY', 4)) # categories searched at the same time
+SCOPUS_HTTP_POOL_SIZE = int(os.environ.get('SCOPUS_HTTP_POOL_SIZE', 10)) # keep-alive connections per process
+SCOPUS_CONNECT_TIMEOUT = float(os.environ.get('SCOPUS_CONNECT_TIMEOUT', 10)) # seconds
+SCOPUS_READ_TIMEOUT = float(os.environ.get('SCOPUS_READ_TIMEOUT', 60)) # seconds
+SCOPUS_REQUESTS_PER_SECOND = float(os.environ.get('SCOPUS_REQUESTS_PER_SECOND', 6)) # per API, across all processes
+SCOPUS_QUOTA_RESERVE = int(os.environ.get('SCOPUS_QUOTA_RESERVE', 500)) # per API, kept for interactive requests
+SCOPUS_PREFETCH_PAGES = int(os.environ.get('SCOPUS_PREFETCH_PAGES', 2)) # search pages fetched ahead of the page being written
+SCOPUS_CHECKPOINT_PAGES = int(os.environ.get('SCOPUS_CHECKPOINT_PAGES', 5)) # pages between search progress checkpoints
+SCOPUS_CHECKPOINT_SECS = float(os.environ.get('SCOPUS_CHECKPOINT_SECS', 30)) # or seconds, whichever comes first
+CATALOG_VERSION_CHECK_SECS = int(os.environ.get('CATALOG_VERSION_CHECK_SECS', 10)) # how often processes check for a new catalog
+SEARCH_PROGRESS_POLL_SECS = int(os.environ.get('SEARCH_PROGRESS_POLL_SECS', 5)) # how long a progress stream waits for an event
+SEARCH_RESPONSE_CACHE_HRS = int(os.environ.get('SEARCH_RESPONSE_CACHE_HRS', 7*24)) # how long finished search responses stay cached
+SEARCH_RESPONSE_MAX_AGE = int(os.environ.get('SEARCH_RESPONSE_MAX_AGE', 300)) # seconds browsers reuse them before revalidating
+ABSTRACT_CACHE_TTL_HRS = int(os.environ.get('ABSTRACT_CACHE_TTL_HRS', 30*24)) # how long cached abstracts are served
+ABSTRACT_CACHE_MAX_ENTRIES = int(os.environ.get('ABSTRACT_CACHE_MAX_ENTRIES', 100000)) # oldest abstracts are evicted beyond this
+ABSTRACT_PREFETCH_SOURCES = int(os.environ.get('ABSTRACT_PREFETCH_SOURCES', 3)) # largest sources per category to prefetch; 0 disables
+ABSTRACT_PREFETCH_ENTRIES = int(os.environ.get('ABSTRACT_PREFETCH_ENTRIES', 10)) # first entries per source to prefetch
+ABSTRACT_PREFETCH_SEARCH_BUDGET = int(os.environ.get('ABSTRACT_PREFETCH_SEARCH_BUDGET', 100)) # most abstracts prefetched per search
+ABSTRACT_PREFETCH_QUOTA_SHARE = float(os.environ.get('ABSTRACT_PREFETCH_QUOTA_SHARE', 0.02)) # most of the unreserved quota one prefetch may use
+ABSTRACT_PREFETCH_CONCURRENCY = int(os.environ.get('ABSTRACT_PREFETCH_CONCURRENCY', 4)) # abstracts fetched at the same time
 
 # Settings keys to make available to template context
 CONTEXT_SETTINGS = ('DEBUG', 'ENVIRONMENT', 'BASE_URL')
@@ -5,37 +5,49 @@ References:
 https://python-rq.org/
 https://devcenter.heroku.com/articles/python-rq
 """
+# Standard
+import os
+
 # 3rd party
 from django import db
 from django.conf import settings
 from rq import Connection, Queue, Worker
 from rq.exceptions import NoSuchJobError
+from rq.registry import ScheduledJobRegistry
 import redis
 
 # Constants
 ALL_QUEUES = ['high', 'default', 'low']
+PENDING_JOB_STATUSES = ['queued', 'deferred', 'scheduled', 'started'] # jobs that are yet to run or are running
+
+# Process-wide redis connection (see `get_redis_conn()`)
+_redis_conn = None
+_redis_conn_pid = None
 
 
 #
-# -- Private functions
+# -- Public functions
 #
 
 
-def _get_redis_conn():
-    """Return redis connection for workers."""
-    return redis.from_url(settings.REDISTOGO_URL)
+def get_redis_conn():
+    """Return redis connection for workers (and for any other state shared between processes).
 
+    The connection (and its connection pool) is shared within a process, but not across a fork.
+    """
+    global _redis_conn, _redis_conn_pid
 
-#
-# -- Public functions
-#
+    if _redis_conn is None or _redis_conn_pid != os.getpid():
+        _redis_conn = redis.from_url(settings.REDISTOGO_URL)
+        _redis_conn_pid = os.getpid()
+    return _redis_conn
 
 
 def worker():
     """Start worker."""
     print(f"worker(): start")
 
-    with Connection(_get_redis_conn()):
+    with Connection(get_redis_conn()):
         # Close DB connection prior to starting worker to force the forked worker process to open
         # its own connection. Otherwise, queries will fail.
         db.connections.close_all()
@@ -43,35 +55,76 @@ def worker():
         # Setup worker to listen to all work queues
         worker = Worker(ALL_QUEUES)
 
-        # Start worker
-        worker.work(burst=False)
+        # Start worker; the scheduler enqueues jobs that were queued to run at a later time
+        worker.work(burst=False, with_scheduler=True)
 
     print(f"worker(): exit")
 
 
 def get_workers():
-    q = Queue(connection=_get_redis_conn())
+    q = Queue(connection=get_redis_conn())
     return Worker.all(queue=q)
 
 
-def queue_job(f, *args, **kwargs):
-    """Queue job for worker."""
-    print(f"queue_job(): {f}: {args}, {kwargs}")
+def queue_job(f, *args, queue_name='default', **kwargs):
+    """Queue job for worker.
+
+    Arguments:
+    f -- the function to be executed by the worker
+    queue_name -- (optional) the queue to place the job on, one of ALL_QUEUES; workers take jobs from
+        'high' before 'default' and from 'default' before 'low'
+    (remaining arguments are passed to `Queue.enqueue()`)
+    """
+    print(f"queue_job(): {f}: {queue_name}, {args}, {kwargs}")
+    assert queue_name in ALL_QUEUES, f"Unknown queue, {queue_name}"
 
     # Enqueue the job
-    q = Queue(connection=_get_redis_conn())
+    q = Queue(queue_name, connection=get_redis_conn())
     job = q.enqueue(f, *args, **kwargs)
 
     print(f"queue_job(): {f}: {job.id}")
     return job
 
 
+def fetch_job(job_id):
+    """Return job identified by ID, or None if there is no such job."""
+    if job_id:
+        q = Queue(connection=get_redis_conn())
+        return q.fetch_job(job_id)
+    return None
+
+
+def is_job_pending(job_id):
+    """Return True if the job identified by ID is in queue, is scheduled to be queued later or is being
+    executed by a worker; False if it has finished, has failed or no longer exists."""
+    job = fetch_job(job_id)
+    return job is not None and job.get_status() in PENDING_JOB_STATUSES
+
+
+def queue_job_at(when, f, *args, queue_name='default', **kwargs):
+    """Queue job for worker to execute at a later time.
+
+    Arguments:
+    when -- a datetime; the job won't be executed before then
+    (remaining arguments are the same as for `queue_job()`)
+    """
+    print(f"queue_job_at(): {f}: {when}, {queue_name}, {args}, {kwargs}")
+    assert queue_name in ALL_QUEUES, f"Unknown queue, {queue_name}"
+
+    # Schedule the job
+    q = Queue(queue_name, connection=get_redis_conn())
+    job = q.enqueue_at(when, f, *args, **kwargs)
+
+    print(f"queue_job_at(): {f}: {job.id}")
+    return job
+
+
 def dequeue_job(job_id):
     """Dequeue job for worker."""
     print(f"queue_job(): job_id = {job_id}")
     if job_id:
         # Fetch the job
-        q = Queue(connection=_get_redis_conn())
+        q = Queue(connection=get_redis_conn())
         job = q.fetch_job(job_id)
         if job:
             # Cancel and delete the job
@@ -80,8 +133,12 @@ def dequeue_job(job_id):
 
 
 def get_pending_jobs():
-    """Return list of rq Job objects that are still in queue or that are being executed by the worker."""
-    q = Queue(connection=_get_redis_conn())
+    """Return list of rq Job objects that are still in queue, that are scheduled to be queued later or
+    that are being executed by the worker."""
+    q = Queue(connection=get_redis_conn())
+
+    # Get jobs scheduled for later (e.g. searches waiting for the Scopus quota to reset)
+    scheduled_jobs = [q.fetch_job(job_id) for job_id in ScheduledJobRegistry(queue=q).get_job_ids()]
 
     # Get current job from worker (may be None)
     try:
@@ -89,6 +146,6 @@ def get_pending_jobs():
     except NoSuchJobError:
         current_jobs = []
 
-    # Return any jobs in the queue + the current job (if not None)
-    return q.jobs + [job for job in current_jobs if job]
+    # Return any jobs in the queue + any scheduled jobs + the current job (if not None)
+    return q.jobs + [job for job in scheduled_jobs if job] + [job for job in current_jobs if job]
 
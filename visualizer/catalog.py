@@ -0,0 +1,277 @@
+"""
+In-process caches of Scopus reference data.
+
+Scopus subject area classifications and sources (and their classifications) are loaded into the
+database by the `populate_database` management command and otherwise never change. Rather than query
+them over and over, each process keeps its own copy and reloads it only after `populate_database`
+bumps the catalog version that is shared through Redis.
+
+The version is read from Redis at most once every settings.CATALOG_VERSION_CHECK_SECS seconds; if
+Redis can't be reached, processes carry on with the catalog they have loaded.
+"""
+# Standard
+from array import array
+from bisect import bisect_left
+from hashlib import sha1
+import json
+import sys
+import threading
+from time import monotonic
+
+# 3rd party
+from django.conf import settings
+from django.utils.http import quote_etag
+
+# Internal
+from project.worker import get_redis_conn
+from visualizer.models import ScopusClassification, ScopusSource
+
+# Constants
+CATALOG_VERSION_KEY = 'visualizer:catalog:version'
+
+# Catalog version as last read from Redis (see `check_catalog_version()`)
+_version = 0
+_version_checked_at = None
+_version_lock = threading.Lock()
+
+
+#
+# -- Catalog version
+#
+
+
+def get_catalog_version():
+    """Return current catalog version (0 if the catalog has never been versioned)."""
+    version = get_redis_conn().get(CATALOG_VERSION_KEY)
+    return int(version) if version else 0
+
+
+def check_catalog_version():
+    """Return catalog version, as read from Redis at most once every settings.CATALOG_VERSION_CHECK_SECS
+    seconds. If Redis can't be reached, the error is logged and the version last read is returned, so
+    that the catalog already loaded stays in use.
+    """
+    global _version, _version_checked_at
+
+    with _version_lock:
+        now = monotonic()
+        if _version_checked_at is None or now - _version_checked_at >= settings.CATALOG_VERSION_CHECK_SECS:
+            _version_checked_at = now
+            try:
+                _version = get_catalog_version()
+            except Exception as exc:
+                print(f"check_catalog_version(): WARNING: {exc}, keeping catalog version {_version}")
+        return _version
+
+
+def bump_catalog_version():
+    """Increment catalog version, which signals every process to reload its copy of the catalog."""
+    version = get_redis_conn().incr(CATALOG_VERSION_KEY)
+    print(f"bump_catalog_version(): INFO: catalog version {version}")
+    return version
+
+
+#
+# -- Classifications
+#
+
+
+class ClassificationCatalog(object):
+    """Scopus subject area categories and classifications, keyed by category abbreviation and by
+    classification code, along with a strong ETag of the whole catalog (which changes only when the
+    catalog version does).
+
+    Dictionaries are shared by every caller; treat them as read-only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._catalog = ({}, {}, {}, None) # (categories, classifications, codes per category, ETag); swapped as a whole on reload
+
+    def categories(self):
+        """Return dictionary of categories, ordered by abbreviation (e.g. {'AGRI': {'abbr': 'AGRI', 'name': ...}, ...})."""
+        self.load()
+        return self._catalog[0]
+
+    def classifications(self):
+        """Return dictionary of classifications, ordered by code (e.g. {'1100': {'code': '1100', 'name': ...,
+        'category_abbr': 'AGRI', 'category_name': ...}, ...}).
+        """
+        self.load()
+        return self._catalog[1]
+
+    def category_classifications(self, category):
+        """Return tuple of the classifications within a category, ordered by code.
+
+        Arguments:
+        category -- a string; a scopus category abbreviation (e.g. 'CHEM')
+        """
+        self.load()
+        return self._catalog[2].get(category, ())
+
+    def etag(self):
+        """Return strong ETag of the catalog (see `classifications()` and `categories()`)."""
+        self.load()
+        return self._catalog[3]
+
+    def load(self, force=False):
+        """Load classifications from the database, unless they've already been loaded for the current catalog version."""
+        version = check_catalog_version()
+        with self._lock:
+            if force or version != self._version:
+                categories, classifications, category_classifications = {}, {}, {}
+                for classification in ScopusClassification.objects.order_by('code').values(
+                        'code', 'name', 'category_abbr', 'category_name'):
+                    abbr = classification['category_abbr']
+                    classifications[classification['code']] = classification
+                    categories.setdefault(abbr, {'abbr': abbr, 'name': classification['category_name']})
+                    category_classifications.setdefault(abbr, []).append(classification)
+                categories = {abbr: categories[abbr] for abbr in sorted(categories)}
+                etag = quote_etag(sha1(json.dumps([categories, classifications]).encode()).hexdigest())
+                self._catalog = (
+                    categories,
+                    classifications,
+                    {abbr: tuple(category) for abbr, category in category_classifications.items()},
+                    etag,
+                )
+                self._version = version
+                print(f"ClassificationCatalog.load(): INFO: {len(classifications)} classifications, catalog version {version}")
+
+
+# Process-wide catalog
+_classification_catalog = ClassificationCatalog()
+
+
+def get_categories():
+    """Return dictionary of all Scopus subject area categories, keyed by abbreviation (e.g. 'CHEM')."""
+    return _classification_catalog.categories()
+
+
+def get_classifications():
+    """Return dictionary of all Scopus subject area classifications, keyed by code (e.g. '1602')."""
+    return _classification_catalog.classifications()
+
+
+def get_classification(code):
+    """Return the Scopus subject area classification identified by code (e.g. '1602'), or None if unknown."""
+    return _classification_catalog.classifications().get(code)
+
+
+def get_category_classifications(category):
+    """Return tuple of the Scopus subject area classifications within category (e.g. 'CHEM')."""
+    return _classification_catalog.category_classifications(category)
+
+
+def get_classification_catalog_etag():
+    """Return strong ETag of the Scopus subject area categories and classifications."""
+    return _classification_catalog.etag()
+
+
+#
+# -- Sources
+#
+
+
+class SourceResolver(object):
+    """Map Scopus source IDs (e.g. 21100829147) to ScopusSource primary keys, and ScopusSource primary
+    keys to classification codes and categories.
+
+    The source ID map is held as two parallel, sorted arrays of 64-bit integers, which is far more
+    compact than a dictionary of tens of thousands of Python ints; lookups are binary searches.
+
+    Only `resolve()` checks the catalog version; it's called once per page of search results, so the
+    per-entry lookups that follow (`classification_codes()`, `categories()`) are plain dictionary reads
+    of the sources it resolved against.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._sources = (array('q'), array('q')) # (source IDs, primary keys); swapped as a pair on reload
+        self._classification_codes = {} # primary key -> tuple of classification codes
+        self._categories = {} # primary key -> tuple of category abbreviations
+
+    def resolve(self, source_ids):
+        """Return dictionary mapping each known Scopus source ID in source_ids to a ScopusSource primary key.
+
+        Arguments:
+        source_ids -- an iterable of integer Scopus source IDs
+        """
+        self.load()
+        known_ids, known_pks = self._sources
+        resolved = {}
+        for source_id in source_ids:
+            idx = bisect_left(known_ids, source_id)
+            if idx < len(known_ids) and known_ids[idx] == source_id:
+                resolved[source_id] = known_pks[idx]
+        return resolved
+
+    def classification_codes(self, source_pk):
+        """Return tuple of the classification codes (e.g. ('1602', '1607')) assigned to a ScopusSource.
+
+        Arguments:
+        source_pk -- a ScopusSource primary key, as resolved by `resolve()`
+        """
+        return self._classification_codes.get(source_pk, ())
+
+    def categories(self, source_pk):
+        """Return tuple of the categories (e.g. ('CHEM', 'PHYS')) of the classifications assigned to a ScopusSource.
+
+        Arguments:
+        source_pk -- a ScopusSource primary key, as resolved by `resolve()`
+        """
+        return self._categories.get(source_pk, ())
+
+    def load(self, force=False):
+        """Load sources from the database, unless they've already been loaded for the current catalog version."""
+        version = check_catalog_version()
+        with self._lock:
+            if force or version != self._version:
+                source_ids, source_pks = array('q'), array('q')
+                for source_id, source_pk in ScopusSource.objects.order_by('source_id').values_list('source_id', 'id'):
+                    source_ids.append(source_id)
+                    source_pks.append(source_pk)
+                classification_codes, categories = {}, {}
+                through = ScopusSource.classifications.through
+                for source_pk, code, category in through.objects.values_list(
+                        'scopussource_id', 'scopusclassification__code', 'scopusclassification__category_abbr'):
+                    classification_codes.setdefault(source_pk, []).append(sys.intern(code))
+                    if category not in categories.setdefault(source_pk, []):
+                        categories[source_pk].append(sys.intern(category))
+                self._sources = (source_ids, source_pks)
+                self._classification_codes = {pk: tuple(codes) for pk, codes in classification_codes.items()}
+                self._categories = {pk: tuple(abbrs) for pk, abbrs in categories.items()}
+                self._version = version
+                print(f"SourceResolver.load(): INFO: {len(source_ids)} sources, catalog version {version}")
+
+
+# Process-wide resolver
+_source_resolver = SourceResolver()
+
+
+def resolve_sources(source_ids):
+    """Return dictionary mapping each known Scopus source ID in source_ids to a ScopusSource primary key."""
+    return _source_resolver.resolve(source_ids)
+
+
+def get_source_classification_codes(source_pk):
+    """Return tuple of the classification codes assigned to the ScopusSource identified by primary key (as
+    resolved by `resolve_sources()`, without checking the catalog version again)."""
+    return _source_resolver.classification_codes(source_pk)
+
+
+def get_source_categories(source_pk):
+    """Return tuple of the categories of the classifications assigned to the ScopusSource identified by primary
+    key (as resolved by `resolve_sources()`, without checking the catalog version again)."""
+    return _source_resolver.categories(source_pk)
+
+
+def load_catalog(force=False):
+    """Load catalog into this process ahead of time (e.g. before a worker starts forking work horses).
+
+    Arguments:
+    force -- (optional) a boolean; reload the catalog even if the catalog version hasn't changed
+    """
+    _classification_catalog.load(force=force)
+    _source_resolver.load(force=force)
@@ -0,0 +1,141 @@
+"""
+Cheap progress checkpoints for long-running Scopus searches.
+
+A search category may run to thousands of pages. Rather than write its progress (next page cursor,
+category counts) to the database after every page, a `Checkpointer` holds progress in memory and
+flushes it to a small SearchCheckpoint row every settings.SCOPUS_CHECKPOINT_PAGES pages or
+settings.SCOPUS_CHECKPOINT_SECS seconds, whichever comes first.
+
+Progress is flushed only at page boundaries, after a page of entries has been written, so a resumed
+search never skips entries; at worst it re-reads a few pages, whose entries are ignored as duplicates.
+
+When the worker is asked to shut down (SIGTERM, e.g. a Heroku dyno restart), every category search
+flushes its checkpoint at the next page boundary and raises SearchInterrupted, so the search can be
+rescheduled to resume where it left off (see `visualizer.scopus.get_search_results()`).
+"""
+# Standard
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import signal
+import threading
+from time import monotonic
+
+# 3rd party
+from django.conf import settings
+from django.db import transaction
+
+# Internal
+from visualizer.models import SearchCheckpoint, SearchResult_Category
+
+# Set once the worker has been asked to shut down
+_shutdown = threading.Event()
+
+
+class SearchInterrupted(Exception):
+    """Raised at a page boundary, after progress has been checkpointed, once the worker is shutting down."""
+
+
+class Checkpointer(object):
+    """Buffered progress of a single crawl of Scopus search results; normally the search of a single
+    category, but a single pass search (see `Search.MODE_SINGLE_PASS`) covers many categories at once.
+    """
+
+    def __init__(self, search, category, pages=None, secs=None):
+        """Initialize checkpointer; load cursor of the crawl if it was previously interrupted.
+
+        Arguments:
+        search -- a Search object
+        category -- a string; a scopus category abbreviation (e.g. 'CHEM') or another key that identifies
+            the crawl
+        pages -- (optional) an integer; the most pages to ingest between flushes; defaults to
+            settings.SCOPUS_CHECKPOINT_PAGES
+        secs -- (optional) a number; the most seconds to let pass between flushes; defaults to
+            settings.SCOPUS_CHECKPOINT_SECS
+        """
+        self.search = search
+        self.category = category
+        self.max_pages = pages or settings.SCOPUS_CHECKPOINT_PAGES
+        self.max_secs = secs or settings.SCOPUS_CHECKPOINT_SECS
+
+        checkpoint = SearchCheckpoint.objects.filter(search=search, category_abbr=category).first()
+        self.cursor = search.get_next_cursor(category)
+        self.pages = checkpoint.pages if checkpoint else 0
+        self.tallies = defaultdict(Counter) # per category, entry counts not yet added to its search results record
+
+        self._dirty_pages = 0
+        self._flushed_at = monotonic()
+
+    def advance(self, cursor, tallies):
+        """Record that a page of entries has been written; flush progress if it's due (or if the
+        worker is shutting down, in which case raise SearchInterrupted).
+
+        Arguments:
+        cursor -- a string; the cursor of the next page of Scopus results
+        tallies -- a dictionary mapping category to counts of the entries created for the page (see
+            `SearchResult_Category.add_counts()`)
+        """
+        self.cursor = cursor
+        self.pages += 1
+        for category, tally in tallies.items():
+            self.tallies[category].update(tally)
+        self._dirty_pages += 1
+
+        if _shutdown.is_set():
+            self.flush()
+            print(f"Checkpointer.advance(): INFO: {self.search.query}, {self.category}, interrupted at cursor {cursor}")
+            raise SearchInterrupted(f"Search {self.search.id} interrupted in {self.category}")
+
+        if self._dirty_pages >= self.max_pages or monotonic() - self._flushed_at >= self.max_secs:
+            self.flush()
+
+    def flush(self):
+        """Write buffered progress to the database: the category counts and, if any pages have been
+        ingested since the last flush, the cursor.
+        """
+        with transaction.atomic():
+            for category, tally in self.tallies.items():
+                SearchResult_Category.add_counts(self.search, category, tally)
+            if self._dirty_pages:
+                SearchCheckpoint.objects.update_or_create(
+                    search=self.search,
+                    category_abbr=self.category,
+                    defaults={'cursor': self.cursor, 'pages': self.pages},
+                )
+        self.tallies.clear()
+        self._dirty_pages = 0
+        self._flushed_at = monotonic()
+
+
+#
+# -- Public functions
+#
+
+
+@contextmanager
+def shutdown_handler():
+    """Context manager in which SIGTERM interrupts category searches at their next page boundary (see
+    SearchInterrupted), rather than killing the process outright.
+
+    Signal handlers may only be installed from the main thread; elsewhere this does nothing. The
+    handler only sets a flag, so it is safe to run wherever the main thread happens to be, including
+    in the middle of a database query. The previous handler is restored on exit.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    _shutdown.clear()
+    previous = signal.signal(signal.SIGTERM, _handle_shutdown)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+
+#
+# -- Private functions
+#
+
+
+def _handle_shutdown(signum, frame):
+    print(f"_handle_shutdown(): INFO: received signal {signum}, checkpointing searches")
+    _shutdown.set()
@@ -0,0 +1,104 @@
+"""
+Benchmark category count queries for the visualizer app. See help text for usage details.
+"""
+# Standard
+from collections import OrderedDict
+from time import perf_counter
+
+# 3rd Party
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Internal
+from visualizer.models import ScopusClassification, Search, SearchResult_Entry, CATEGORIES
+from visualizer.scopus import get_category_counts
+
+from argparse import RawTextHelpFormatter
+
+
+class Command(BaseCommand):
+    help = '''
+How To:
+  1. Pick a large, finished search (e.g. from the search listing in the UI) and note its ID.
+  2. Execute this script: `python manage.py benchmark_category_counts <search_id>`.
+  3. Optionally limit the benchmark to some categories: `--category CHEM --category MEDI`.
+
+For each category, counts are computed the legacy way (one COUNT query per classification) and with
+the single aggregate query used by `get_category_counts()`. Query counts and timings are reported for
+both, along with a check that the two approaches agree.
+    '''
+
+    def create_parser(self, * args, ** kwargs):
+        parser = super(Command, self).create_parser( * args, ** kwargs)
+        parser.formatter_class = RawTextHelpFormatter # respect line breaks in help text
+        return parser
+
+    def add_arguments(self, parser):
+        # Positional arguments
+        parser.add_argument('search_id', type=int, help='ID of the search to benchmark')
+
+        # Named (optional) arguments
+        parser.add_argument(
+            '--category',
+            action='append',
+            dest='categories',
+            default=None,
+            help='Category to benchmark (may be repeated); defaults to all categories of the search',
+        )
+
+    def handle(self, *args, **kwargs):
+        self.preamble = f"benchmark_category_counts:"
+
+        search = Search.objects.get(id=kwargs['search_id'])
+        categories = kwargs.get('categories') or search.context[CATEGORIES]
+
+        print(f"{self.preamble} begin, {search.query} ({search.id}), {len(categories)} categories")
+
+        totals = {'legacy': [0, 0.0], 'aggregate': [0, 0.0]}
+        for category in categories:
+            legacy_counts, legacy_queries, legacy_secs = self._measure(_get_category_counts_legacy, search, category)
+            counts, queries, secs = self._measure(get_category_counts, search, category)
+
+            totals['legacy'][0] += legacy_queries
+            totals['legacy'][1] += legacy_secs
+            totals['aggregate'][0] += queries
+            totals['aggregate'][1] += secs
+
+            match = 'OK' if legacy_counts == counts else 'MISMATCH'
+            print(f"{self.preamble}     {category}: {counts['total']['count']} entries, "+
+                f"legacy {legacy_queries} queries {legacy_secs:.3f}s, aggregate {queries} queries {secs:.3f}s, {match}")
+
+        for approach, (queries, secs) in totals.items():
+            print(f"{self.preamble} {approach}: {queries} queries, {secs:.3f}s")
+
+        print(f"{self.preamble} end")
+
+    def _measure(self, f, *args):
+        """Return result of f(*args), the number of queries it executed and the seconds it took."""
+        with CaptureQueriesContext(connection) as context:
+            start = perf_counter()
+            result = f(*args)
+            secs = perf_counter() - start
+        return (result, len(context.captured_queries), secs)
+
+
+def _get_category_counts_legacy(search, category):
+    """Return category counts the way they were computed before `get_category_counts()` (one query per count),
+    in the same order, so that the two can be compared."""
+    counts = OrderedDict({})
+    entries = SearchResult_Entry.objects.filter(search=search, category_abbr=category)
+    counts['total'] = {
+        'name': 'Total',
+        'count': entries.count(),
+    }
+    for classification in ScopusClassification.objects.filter(category_abbr=category).order_by('code'):
+        counts[classification.code] = {
+            'name': classification.name,
+            'count': entries.filter(scopus_source__classifications__code=classification.code).count(),
+        }
+    counts[ScopusClassification.UNKNOWN] = {
+        'name': 'Unknown',
+        'count': entries.filter(SearchResult_Entry.UNCLASSIFIED).count(),
+    }
+    return counts
@@ -3,12 +3,17 @@ Populate data models for the visualizer app. See help text for usage details.
 """
 # Standard
 import csv
+from itertools import islice
 import re
 
 # 3rd Party
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from psycopg2.extras import execute_values
 
 # Internal
+from visualizer.catalog import bump_catalog_version
 from visualizer.models import ScopusClassification, ScopusSource
 from visualizer.scopus import get_subject_area_classifications
 
@@ -21,6 +26,7 @@ SOURCE_NAME_COLUMN_NAME = 'Source Title (Medline-sourced journals are indicated
 P_ISSN_COLUMN_NAME = 'Print-ISSN'
 E_ISSN_COLUMN_NAME = 'E-ISSN'
 CLASSIFICATION_COLUMN_NAME = 'All Science Journal Classification Codes (ASJC)' # list of comma-separated classification codes
+SOURCE_BATCH_SIZE = 1000 # sources read, upserted and linked to their classifications at a time
 
 class Command(BaseCommand):
     help = '''
@@ -65,63 +71,114 @@ How To:
 
         # Update or create internal classification records to align with current Scopus data
         if self.execute:
-            for _, c in classifications.items():
-                ScopusClassification.objects.update_or_create(code=c['code'], defaults={
-                    'name': c['name'],
-                    'category_abbr': c['category_abbr'],
-                    'category_name': c['category_name'],
-                })
-
-        # Open CSV file of sources and read it in, row-by-row
+            with transaction.atomic():
+                for _, c in classifications.items():
+                    ScopusClassification.objects.update_or_create(code=c['code'], defaults={
+                        'name': c['name'],
+                        'category_abbr': c['category_abbr'],
+                        'category_name': c['category_name'],
+                    })
+
+        # Map classification codes to classification records, once, rather than look them up per source
+        classification_pks = dict(ScopusClassification.objects.values_list('code', 'id'))
+
+        # Open CSV file of sources and stream it, a batch of rows at a time
         with open(CSV_FILEPATH, 'r', encoding='utf-8-sig') as csv_file:
             csv_reader = csv.reader(csv_file, delimiter=',')
-            rows = [row for row in csv_reader]
-
-        # Separate header row from the rest of the rows, which describe the sources
-        header_row = rows[0]
-        source_rows = rows[1:]
-        print(f"{self.preamble} header_row = {header_row}")
-
-        # Determine which columns hold the data we're interested in
-        source_id_col_idx = header_row.index(SOURCE_ID_COLUMN_NAME)
-        source_name_col_idx = header_row.index(SOURCE_NAME_COLUMN_NAME)
-        p_issn_col_idx = header_row.index(P_ISSN_COLUMN_NAME)
-        e_issn_col_idx = header_row.index(E_ISSN_COLUMN_NAME)
-        classification_col_idx = header_row.index(CLASSIFICATION_COLUMN_NAME)
-
-        # Count the sources
-        num_sources = len(source_rows)
-        print(f"{self.preamble} update or create {num_sources} sources")
-
-        # Process each source
-        for idx, row in enumerate(source_rows):
-            source_id = row[source_id_col_idx] or None
-            source_name = row[source_name_col_idx] or None
-            p_issn = row[p_issn_col_idx] or None
-            e_issn = row[e_issn_col_idx] or None
-            classification_codes = row[classification_col_idx] or ''
-
-            # Create (or update) source object
-            if self.execute:
-                source, _ = ScopusSource.objects.update_or_create(source_id=source_id, defaults={
-                    'source_name': source_name,
-                    'p_issn': p_issn,
-                    'e_issn': e_issn,
-                })
-
-            # Add classifications to sources
-            codes = [code.strip() for code in re.split(',|;', classification_codes) if code.strip()]
-            if self.execute:
-                for code in codes:
-                    try:
-                        source.classifications.add(ScopusClassification.objects.get(code=code))
-                    except Exception as exc:
-                        print(f"ERROR: ")
-                        print(f"ERROR: exc = {exc} ({source_id}, {source_name}, {code})")
-                        print(f"ERROR: ")
-
-            # Log progress
-            if idx % 100 == 0:
-                print(f"{self.preamble}     ... {idx} of {num_sources} ...")
+
+            # Separate header row from the rest of the rows, which describe the sources
+            header_row = next(csv_reader)
+            print(f"{self.preamble} header_row = {header_row}")
+
+            # Determine which columns hold the data we're interested in
+            source_id_col_idx = header_row.index(SOURCE_ID_COLUMN_NAME)
+            source_name_col_idx = header_row.index(SOURCE_NAME_COLUMN_NAME)
+            p_issn_col_idx = header_row.index(P_ISSN_COLUMN_NAME)
+            e_issn_col_idx = header_row.index(E_ISSN_COLUMN_NAME)
+            classification_col_idx = header_row.index(CLASSIFICATION_COLUMN_NAME)
+
+            # Process sources in batches
+            num_sources = 0
+            while True:
+                source_rows = list(islice(csv_reader, SOURCE_BATCH_SIZE))
+                if not source_rows:
+                    break
+
+                # Unpack sources; the last row wins if a source is listed more than once
+                sources, source_codes = {}, {}
+                for row in source_rows:
+                    if not row[source_id_col_idx]:
+                        print(f"{self.preamble} WARNING: skipping source without ID, {row[source_name_col_idx]}")
+                        continue
+                    source_id = int(row[source_id_col_idx])
+                    sources[source_id] = (
+                        source_id,
+                        row[source_name_col_idx] or None,
+                        row[p_issn_col_idx] or None,
+                        row[e_issn_col_idx] or None,
+                    )
+                    classification_codes = row[classification_col_idx] or ''
+                    source_codes[source_id] = [code.strip() for code in re.split(',|;', classification_codes) if code.strip()]
+
+                # Report classification codes we know nothing about
+                for source_id, codes in source_codes.items():
+                    for code in codes:
+                        if code not in classification_pks:
+                            print(f"ERROR: ")
+                            print(f"ERROR: unknown classification ({source_id}, {sources[source_id][1]}, {code})")
+                            print(f"ERROR: ")
+
+                # Create (or update) sources, then add their classifications, in one transaction per batch
+                # (unless no row of the batch describes a source)
+                if self.execute and sources:
+                    with transaction.atomic():
+                        source_pks = _upsert_sources(list(sources.values()))
+                        through = ScopusSource.classifications.through
+                        through.objects.bulk_create([
+                            through(scopussource_id=source_pks[source_id], scopusclassification_id=classification_pks[code])
+                            for source_id, codes in source_codes.items() for code in codes if code in classification_pks
+                        ], ignore_conflicts=True)
+
+                # Log progress
+                num_sources += len(sources)
+                print(f"{self.preamble}     ... {num_sources} sources ...")
+
+        print(f"{self.preamble} updated or created {num_sources} sources")
+
+        # Signal workers to reload their in-process copies of the catalog
+        if self.execute:
+            bump_catalog_version()
 
         print(f"{self.preamble} end")
+
+
+def _upsert_sources(sources):
+    """Insert sources, or update the sources that already exist, with a single statement; return
+    dictionary mapping each Scopus source ID to a ScopusSource primary key.
+
+    References:
+    https://www.postgresql.org/docs/current/sql-insert.html#SQL-ON-CONFLICT
+    https://www.psycopg.org/docs/extras.html#fast-execution-helpers
+
+    Arguments:
+    sources -- a list of (source ID, source name, print ISSN, electronic ISSN) tuples, with distinct source IDs
+    """
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        rows = execute_values(
+            cursor,
+            f"""
+            INSERT INTO {ScopusSource._meta.db_table} (source_id, source_name, p_issn, e_issn, created, modified)
+            VALUES %s
+            ON CONFLICT (source_id) DO UPDATE SET
+                source_name = EXCLUDED.source_name,
+                p_issn = EXCLUDED.p_issn,
+                e_issn = EXCLUDED.e_issn,
+                modified = EXCLUDED.modified
+            RETURNING source_id, id
+            """,
+            [source + (now, now) for source in sources],
+            page_size=len(sources),
+            fetch=True,
+        )
+    return dict(rows)
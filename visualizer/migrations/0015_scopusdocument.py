@@ -0,0 +1,88 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Copy each distinct document out of the search result entries (keeping the most recently recorded
+# version of it) and point every entry at its document. Foreign key checks are made immediately so
+# that no trigger events are pending when the entries table is altered later in this migration.
+COPY_DOCUMENTS_SQL = '''
+    SET CONSTRAINTS ALL IMMEDIATE;
+
+    INSERT INTO visualizer_scopusdocument
+        (scopus_id, doi, title, first_author, document_type, publication_name, scopus_source_id)
+    SELECT DISTINCT ON (scopus_id::bigint)
+        scopus_id::bigint, doi, title, first_author, document_type, publication_name, scopus_source_id
+    FROM visualizer_searchresult_entry
+    ORDER BY scopus_id::bigint, id DESC;
+
+    UPDATE visualizer_searchresult_entry SET document_id = scopus_id::bigint;
+
+    SET CONSTRAINTS ALL DEFERRED;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualizer', '0014_search_job_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScopusDocument',
+            fields=[
+                ('scopus_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('doi', models.CharField(blank=True, max_length=256, null=True)),
+                ('title', models.TextField()),
+                ('first_author', models.CharField(blank=True, max_length=128, null=True)),
+                ('document_type', models.CharField(blank=True, max_length=2, null=True)),
+                ('publication_name', models.TextField(blank=True, null=True)),
+                ('scopus_source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='visualizer.ScopusSource')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='searchresult_entry',
+            name='document',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='visualizer.ScopusDocument'),
+        ),
+        migrations.RunSQL(COPY_DOCUMENTS_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name='searchresult_entry',
+            name='document',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='visualizer.ScopusDocument'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchresult_entry',
+            unique_together={('search', 'category_abbr', 'document')},
+        ),
+        migrations.RemoveField(
+            model_name='searchresult_entry',
+            name='document_type',
+        ),
+        migrations.RemoveField(
+            model_name='searchresult_entry',
+            name='doi',
+        ),
+        migrations.RemoveField(
+            model_name='searchresult_entry',
+            name='first_author',
+        ),
+        migrations.RemoveField(
+            model_name='searchresult_entry',
+            name='publication_name',
+        ),
+        migrations.RemoveField(
+            model_name='searchresult_entry',
+            name='scopus_id',
+        ),
+        migrations.RemoveField(
+            model_name='searchresult_entry',
+            name='scopus_source',
+        ),
+        migrations.RemoveField(
+            model_name='searchresult_entry',
+            name='title',
+        ),
+    ]
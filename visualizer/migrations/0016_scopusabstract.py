@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:26
+
+from django.db import migrations, models
+import django_extensions.db.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualizer', '0015_scopusdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScopusAbstract',
+            fields=[
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('scopus_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('abstract', models.TextField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='scopusabstract',
+            index=models.Index(fields=['modified'], name='visualizer__modifie_50ac2c_idx'),
+        ),
+    ]
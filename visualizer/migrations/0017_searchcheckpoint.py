@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualizer', '0016_scopusabstract'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category_abbr', models.CharField(max_length=4)),
+                ('cursor', models.TextField()),
+                ('pages', models.IntegerField(default=0)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='visualizer.Search')),
+            ],
+            options={
+                'unique_together': {('search', 'category_abbr')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualizer', '0017_searchcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scopusdocument',
+            name='scopus_source',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='visualizer.ScopusSource'),
+        ),
+        migrations.AlterField(
+            model_name='searchresult_entry',
+            name='category_abbr',
+            field=models.CharField(max_length=4),
+        ),
+        migrations.AddIndex(
+            model_name='scopusdocument',
+            index=models.Index(fields=['scopus_source', 'title', 'scopus_id'], name='visualizer_doc_source_title'),
+        ),
+        migrations.AddIndex(
+            model_name='scopusdocument',
+            index=models.Index(condition=models.Q(scopus_source__isnull=True), fields=['publication_name', 'title', 'scopus_id'], name='visualizer_doc_unknown_title'),
+        ),
+        migrations.AddIndex(
+            model_name='searchresult_entry',
+            index=models.Index(fields=['search', 'document'], name='visualizer_entry_search_doc'),
+        ),
+    ]
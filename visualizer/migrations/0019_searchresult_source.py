@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualizer', '0018_drilldown_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchResult_Source',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category_abbr', models.CharField(max_length=4)),
+                ('classification_code', models.CharField(max_length=8)),
+                ('source_id', models.BigIntegerField(blank=True, null=True)),
+                ('source_name', models.TextField(blank=True, null=True)),
+                ('count', models.IntegerField()),
+                ('search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sources', to='visualizer.Search')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchresult_source',
+            index=models.Index(fields=['search', 'category_abbr', 'classification_code', '-count', 'id'], name='visualizer_source_rollup_top'),
+        ),
+    ]
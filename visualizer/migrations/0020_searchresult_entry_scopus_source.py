@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Record on every entry the source its document has now, which is the source its search found it with
+# unless a later search has since resolved it
+COPY_SOURCES_SQL = '''
+    UPDATE visualizer_searchresult_entry AS entry SET scopus_source_id = document.scopus_source_id
+    FROM visualizer_scopusdocument AS document
+    WHERE document.scopus_id = entry.document_id AND document.scopus_source_id IS NOT NULL;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualizer', '0019_searchresult_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchresult_entry',
+            name='scopus_source',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='visualizer.ScopusSource'),
+        ),
+        migrations.RunSQL(COPY_SOURCES_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
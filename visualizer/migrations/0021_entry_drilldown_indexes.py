@@ -0,0 +1,50 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:11
+
+from django.db import migrations, models
+
+
+# Copy the title and publication name of every entry's document onto the entry, before it is indexed
+COPY_TITLES_SQL = '''
+    UPDATE visualizer_searchresult_entry AS entry
+    SET title = document.title, publication_name = document.publication_name
+    FROM visualizer_scopusdocument AS document
+    WHERE document.scopus_id = entry.document_id;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualizer', '0020_searchresult_entry_scopus_source'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='scopusdocument',
+            name='visualizer_doc_source_title',
+        ),
+        migrations.RemoveIndex(
+            model_name='scopusdocument',
+            name='visualizer_doc_unknown_title',
+        ),
+        migrations.AddField(
+            model_name='searchresult_entry',
+            name='publication_name',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='searchresult_entry',
+            name='title',
+            field=models.TextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(COPY_TITLES_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='searchresult_entry',
+            index=models.Index(fields=['search', 'category_abbr', 'scopus_source', 'title', 'document'], name='visualizer_entry_source_title'),
+        ),
+        migrations.AddIndex(
+            model_name='searchresult_entry',
+            index=models.Index(condition=models.Q(scopus_source__isnull=True), fields=['search', 'category_abbr', 'publication_name', 'title', 'document'], name='visualizer_entry_unknown_title'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualizer', '0021_entry_drilldown_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='searchresult_entry',
+            name='visualizer_entry_unknown_title',
+        ),
+        migrations.AddIndex(
+            model_name='searchresult_entry',
+            index=models.Index(condition=models.Q(('scopus_source__isnull', True), ('category_abbr', 'UNKN'), _connector='OR'), fields=['search', 'category_abbr', 'publication_name', 'title', 'document'], name='visualizer_entry_unknown_title'),
+        ),
+    ]
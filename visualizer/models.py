@@ -4,20 +4,28 @@ Data models for the visualizer app.
 IMPORTANT:
 To populate these data models, use the management command `populate_database.py`
 """
+# Standard
+from datetime import timedelta
+
 # 3rd party
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
 from django.contrib.postgres.fields import jsonb
 from django.core.exceptions import ValidationError
 from django_extensions.db.models import TimeStampedModel
 
 # Internal
-from project.worker import dequeue_job
+from project.worker import dequeue_job, is_job_pending
+from visualizer.response_cache import invalidate_search_responses
 
 # Constants
 CATEGORIES = 'categories'
 FINISHED_CATEGORIES = 'finished_categories'
 NEXT_CATEGORY = 'next_category'
 NEXT_CURSOR = 'next_cursor'
+SEARCH_MODE = 'mode'
 
 
 #
@@ -27,6 +35,7 @@ NEXT_CURSOR = 'next_cursor'
 
 class ScopusClassification(TimeStampedModel):
     UNKNOWN = 'unknown'
+    UNKNOWN_CATEGORY = 'UNKN' # documents whose source is unknown, when categories are assigned locally
 
     # Classification; e.g. 1602, "Analytical Chemistry"
     code = models.CharField(max_length=8)
@@ -44,7 +53,10 @@ class ScopusClassification(TimeStampedModel):
 
     @classmethod
     def all_categories(cls):
-        return list(ScopusClassification.objects.distinct('category_abbr').values_list('category_abbr', flat=True))
+        """Return list of all category abbreviations, from the in-process catalog (see `visualizer.catalog`)."""
+        # Imported here because the catalog is built from these models
+        from visualizer.catalog import get_categories
+        return list(get_categories())
 
 
 class ScopusSource(TimeStampedModel):
@@ -64,6 +76,48 @@ class ScopusSource(TimeStampedModel):
         return f"{self.source_name} ({self.source_id})"
 
 
+#
+# -- Scopus Documents
+#
+
+
+class ScopusDocument(models.Model):
+    # Documents are stored once and shared by every search (and every category of a search) whose results
+    # include them; see SearchResult_Entry
+
+    # Scopus ID; e.g. 85115829542
+    scopus_id = models.BigIntegerField(primary_key=True)
+
+    # Document
+    doi = models.CharField(max_length=256, blank=True, null=True)
+    title = models.TextField()
+    first_author = models.CharField(max_length=128, blank=True, null=True)
+    document_type = models.CharField(max_length=2, blank=True, null=True)
+
+    # Document publication
+    publication_name = models.TextField(blank=True, null=True)
+    scopus_source = models.ForeignKey(
+        ScopusSource, blank=True, null=True, related_name='documents', on_delete=models.CASCADE,
+        db_index=False, # search results look documents up by the source of their entries (see SearchResult_Entry)
+    )
+
+    def __str__(self):
+        return f"{self.title} ({self.scopus_id})"
+
+
+class ScopusAbstract(TimeStampedModel):
+    # Abstracts fetched from Scopus are cached here; see `visualizer.scopus.get_cached_abstract()`
+
+    # Scopus ID; e.g. 85115829542
+    scopus_id = models.BigIntegerField(primary_key=True)
+
+    # Abstract text
+    abstract = models.TextField()
+
+    class Meta(object):
+        indexes = [models.Index(fields=['modified'])] # supports expiry and eviction of oldest abstracts
+
+
 #
 # -- Search Results
 #
@@ -72,6 +126,11 @@ class ScopusSource(TimeStampedModel):
 class Search(TimeStampedModel):
     BOOLEAN_OPERATORS = ['AND', 'OR'] # supported boolean operators that may be embedded in the search query; case-sensitive
 
+    # Search modes
+    MODE_CATEGORY = 'category' # Scopus is searched once per category (i.e. filtered by subject area)
+    MODE_SINGLE_PASS = 'single_pass' # Scopus is searched once; documents are assigned to categories by their sources
+    MODES = [MODE_CATEGORY, MODE_SINGLE_PASS]
+
     # The search query
     query = models.TextField()
 
@@ -104,9 +163,39 @@ class Search(TimeStampedModel):
     #
 
     @classmethod
-    def init_search(cls, query, categories=None):
+    def init_search(cls, query, categories=None, mode=None):
         # Create instance of class with query and context initialized
-        return cls.objects.create(query=query, context=Search._init_context(categories))
+        return cls.objects.create(query=query, context=Search._init_context(categories, mode))
+
+    @classmethod
+    def get_fresh_search(cls, query, categories=None, mode=None, max_age_hrs=24):
+        """Return the most recent search for the same query, categories and mode that is still in progress
+        or that finished within the last max_age_hrs hours, if any. A search is only in progress while its
+        job is pending; unfinished searches whose job failed for good (or vanished) have stalled.
+
+        Queries are compared as they would be sent to Scopus (see `_scopus_query()`), ignoring
+        differences in whitespace; categories are compared as sets.
+
+        Arguments:
+        query -- a string; the search query
+        categories -- (optional) a list of scopus category abbreviations; all categories if unspecified
+        mode -- (optional) a search mode (see MODES); settings.SCOPUS_SEARCH_MODE if unspecified
+        max_age_hrs -- (optional) an integer; how long the results of a finished search stay fresh
+        """
+        scopus_query = cls._scopus_query(cls._normalize_query(query))
+        categories = set(categories or ScopusClassification.all_categories())
+        mode = mode or settings.SCOPUS_SEARCH_MODE
+        fresh_since = timezone.now() - timedelta(hours=max_age_hrs)
+
+        searches = cls.objects.filter(deleted=False).filter(Q(finished=False) | Q(modified__gte=fresh_since))
+        for search in searches.order_by('-created'):
+            if (cls._scopus_query(cls._normalize_query(search.query)) == scopus_query and
+                    set(search.context[CATEGORIES]) == categories and
+                    search.mode == mode and
+                    (search.finished or is_job_pending(search.job_id))):
+                return search
+
+        return None
 
     @classmethod
     def delete_search(cls, search_id):
@@ -115,27 +204,78 @@ class Search(TimeStampedModel):
         if search:
             # Cancel any related job
             dequeue_job(search.job_id)
-            # Mark as deleted
-            search.deleted = True
-            search.job_id = None
-            search.save()
+            # Mark as deleted; update the row rather than save the object, so that a context being
+            # updated by the worker meanwhile isn't overwritten
+            Search.objects.filter(id=search.id).update(deleted=True, job_id=None)
+            # Forget its cached responses
+            invalidate_search_responses(search.id)
 
     @classmethod
-    def _init_context(cls, categories=None):
+    def _init_context(cls, categories=None, mode=None):
         # If no categories were specified, default to all categories
         categories = categories or ScopusClassification.all_categories()
+        # If no mode was specified, default to configured mode
+        mode = mode or settings.SCOPUS_SEARCH_MODE
+        assert mode in cls.MODES, f"Unsupported search mode, {mode}"
         # Return initialize context
-        return {CATEGORIES: categories, FINISHED_CATEGORIES: [], NEXT_CATEGORY: None, NEXT_CURSOR: None}
+        return {
+            CATEGORIES: categories,
+            FINISHED_CATEGORIES: [],
+            SEARCH_MODE: mode,
+        }
 
-    def set_next_cursor(self, category, cursor):
-        self.context.update({NEXT_CATEGORY: category, NEXT_CURSOR: cursor})
-        self.save()
+    @property
+    def mode(self):
+        """Search mode (see MODES); searches that predate modes were searched by category."""
+        return self.context.get(SEARCH_MODE) or self.MODE_CATEGORY
+
+    def get_next_cursor(self, category):
+        """Return the cursor at which an interrupted search of category should resume, if any."""
+        checkpoint = SearchCheckpoint.objects.filter(search=self, category_abbr=category).first()
+        if checkpoint:
+            return checkpoint.cursor
+        # Searches started before progress was checkpointed track a single cursor in their context
+        if category == self.context.get(NEXT_CATEGORY):
+            return self.context.get(NEXT_CURSOR)
+        return None
+
+    def finish_category(self, category):
+        """Mark category as finished and forget its cursor."""
+        self.finish_categories([category])
+
+    def finish_categories(self, categories):
+        """Mark categories as finished and forget their cursors."""
+        def update(context):
+            for category in categories:
+                if category not in context[FINISHED_CATEGORIES]:
+                    context[FINISHED_CATEGORIES].append(category)
+        self._update_context(update)
+        SearchCheckpoint.objects.filter(search=self, category_abbr__in=categories).delete()
+
+    def _update_context(self, update):
+        """Apply update function to the context of a freshly locked copy of this search and save it.
+
+        Categories of the same search may be searched concurrently (see `get_search_results()`), so
+        context changes are made against the latest row, under lock, rather than against whatever
+        this instance happened to load.
+        """
+        with transaction.atomic():
+            search = Search.objects.select_for_update().get(id=self.id)
+            update(search.context)
+            search.save()
+        self.context = search.context
+        self.finished = search.finished
 
     @property
     def scopus_query(self):
         """TODO: comment"""
         return self._scopus_query(self.query)
 
+    @classmethod
+    def _normalize_query(cls, query):
+        """Return query with leading, trailing and repeated whitespace removed."""
+        return ' '.join(query.split())
+
     @classmethod
     def _scopus_query(cls, query):
         """TODO: comment
@@ -171,26 +311,129 @@ class SearchResult_Category(TimeStampedModel):
 
     class Meta(object):
         unique_together = [('search', 'category_abbr')]
+
+    @classmethod
+    def get_counts(cls, search):
+        """Return dictionary of entry counts for each category of search, as recorded so far; categories
+        that haven't been started are reported as None. Counts of every category are read in a single query.
+
+        Single pass searches also report the documents that couldn't be assigned to a category (because
+        their source is unknown or unclassified), under ScopusClassification.UNKNOWN_CATEGORY.
+
+        Arguments:
+        search -- a Search object
+        """
+        categories = list(search.context[CATEGORIES])
+        if search.mode == Search.MODE_SINGLE_PASS:
+            categories.append(ScopusClassification.UNKNOWN_CATEGORY)
+        counts = dict(cls.objects.filter(search=search, category_abbr__in=categories).values_list('category_abbr', 'counts'))
+        return {category: counts.get(category) for category in categories}
+
+    @classmethod
+    def add_counts(cls, search, category_abbr, tally):
+        """Add tally of newly ingested entries to the counts of the search results record for category.
+
+        Arguments:
+        search -- a Search object
+        category_abbr -- a string; a scopus category abbreviation (e.g. 'CHEM')
+        tally -- a dictionary of entry counts keyed like `counts` (e.g. {'total': 200, '1602': 150})
+        """
+        if not tally:
+            return
+        with transaction.atomic():
+            category = cls.objects.select_for_update().get(search=search, category_abbr=category_abbr)
+            for key, count in tally.items():
+                if key in category.counts:
+                    category.counts[key]['count'] += count
+            category.save()
+
+
+class SearchResult_Source(models.Model):
+    """Count of the entries of a search within a category and classification that were published by a
+    source; rolled up once the category has been searched (see `visualizer.scopus.build_source_rollups()`).
+    """
+    # Executed search
+    search = models.ForeignKey(Search, related_name='sources', on_delete=models.CASCADE)
+
+    # Category and classification; e.g. "CHEM", "1602" (or "unknown" for entries with unknown sources)
+    category_abbr = models.CharField(max_length=4)
+    classification_code = models.CharField(max_length=8)
+
+    # Source; e.g. 21100829147, "Analytical Chemistry". Unknown sources are identified by publication name only
+    source_id = models.BigIntegerField(blank=True, null=True)
+    source_name = models.TextField(blank=True, null=True)
+
+    count = models.IntegerField()
+
+    class Meta(object):
+        indexes = [
+            # Largest sources first (see `views.search_result_sources()`)
+            models.Index(fields=['search', 'category_abbr', 'classification_code', '-count', 'id'], name='visualizer_source_rollup_top'),
+        ]
+
+
+class SearchCheckpoint(models.Model):
+    """Progress of an unfinished category search; kept apart from the Search row (and its context) so
+    that recording progress is cheap. See `visualizer.checkpoint.Checkpointer`.
+    """
+    # Executed search
+    search = models.ForeignKey(Search, related_name='checkpoints', on_delete=models.CASCADE)
+
+    # Category; e.g. "CHEM"
+    category_abbr = models.CharField(max_length=4)
+
+    # Cursor of the first page of Scopus results not yet ingested; pages ingested so far
+    cursor = models.TextField()
+    pages = models.IntegerField(default=0)
+
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta(object):
+        unique_together = [('search', 'category_abbr')]
     
 
 class SearchResult_Entry(models.Model):
+    # Entries whose classification is unknown: those whose source is unknown and, in single pass searches,
+    # those that couldn't be assigned to a category because their source is unknown or unclassified
+    UNCLASSIFIED = Q(scopus_source__isnull=True) | Q(category_abbr=ScopusClassification.UNKNOWN_CATEGORY)
+
     # Executed search
     search = models.ForeignKey(Search, related_name='entries', on_delete=models.CASCADE)
 
     # Category; e.g. "CHEM"
-    category_abbr = models.CharField(max_length=4, db_index=True)
+    category_abbr = models.CharField(max_length=4)
 
-    # Entry
-    scopus_id = models.CharField(max_length=16)
-    doi = models.CharField(max_length=256, blank=True, null=True)
-    title = models.TextField()
-    first_author = models.CharField(max_length=128, blank=True, null=True)
-    document_type = models.CharField(max_length=2, blank=True, null=True)
+    # Document found by search within category
+    document = models.ForeignKey(ScopusDocument, related_name='entries', on_delete=models.CASCADE)
+
+    # Source of the document as resolved when the search found it (None if unknown then); documents are
+    # shared by searches, so the source is recorded here, where it can't change after the search finished
+    scopus_source = models.ForeignKey(
+        ScopusSource, blank=True, null=True, related_name='entries', on_delete=models.CASCADE,
+        db_index=False, # sources are never deleted (see `populate_database`), and entries are filtered by search first
+    )
 
-    # Entry publication
+    # Title and publication name of the document, copied here so that the entries of a source can be
+    # paged through in title order by index alone (see `views.search_result_entries()`)
+    title = models.TextField()
     publication_name = models.TextField(blank=True, null=True)
-    scopus_source = models.ForeignKey(ScopusSource, blank=True, null=True, related_name='entries', on_delete=models.CASCADE)
 
     class Meta(object):
-        unique_together = [('search', 'category_abbr', 'scopus_id')]
-
+        # The unique index leads with (search, category), which is how entries are almost always filtered
+        unique_together = [('search', 'category_abbr', 'document')]
+        indexes = [
+            # Entries of a search across categories (e.g. documents already recorded by a single pass search)
+            models.Index(fields=['search', 'document'], name='visualizer_entry_search_doc'),
+            # Drill-down into the entries of a known source, in title order
+            models.Index(
+                fields=['search', 'category_abbr', 'scopus_source', 'title', 'document'],
+                name='visualizer_entry_source_title',
+            ),
+            # Drill-down into the entries of unknown classification (see UNCLASSIFIED), by publication name,
+            # in title order
+            models.Index(
+                fields=['search', 'category_abbr', 'publication_name', 'title', 'document'],
+                name='visualizer_entry_unknown_title',
+                condition=Q(scopus_source__isnull=True) | Q(category_abbr=ScopusClassification.UNKNOWN_CATEGORY),
+            ),
+        ]
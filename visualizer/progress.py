@@ -0,0 +1,61 @@
+"""
+Search progress events, published through Redis pub/sub.
+
+Workers publish an event as each page of search results is ingested, as each category finishes and
+as the search itself starts, is rescheduled, finishes or fails. Web processes relay the events of the
+searches a user is watching as a stream (see `visualizer.views.search_progress()`), so nobody needs to
+scan the job queues to learn how a search is getting on.
+
+Events are best effort: nothing is stored, so anyone who isn't subscribed when an event is published
+misses it. Subscribers should read the current state of a search (from the database) after subscribing.
+"""
+# Standard
+import json
+
+# 3rd party
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Internal
+from project.worker import get_redis_conn
+
+# Constants
+PROGRESS_CHANNEL = 'visualizer:search:{search_id}:progress'
+
+# Event types
+EVENT_PAGE = 'page' # a page of search results was ingested
+EVENT_CATEGORY = 'category' # one or more categories finished
+EVENT_STATUS = 'status' # the search started, was rescheduled, finished or failed
+
+
+#
+# -- Public functions
+#
+
+
+def publish_progress(search_id, event, **data):
+    """Publish search progress event. Failures are logged, never raised, so that progress reporting
+    can't interrupt a search.
+
+    Arguments:
+    search_id -- a Search object ID
+    event -- a string; the event type (e.g. EVENT_PAGE)
+    (remaining keyword arguments are JSON-serializable event data)
+    """
+    message = json.dumps({'event': event, 'search_id': search_id, **data}, cls=DjangoJSONEncoder)
+    try:
+        get_redis_conn().publish(PROGRESS_CHANNEL.format(search_id=search_id), message)
+    except Exception as exc:
+        print(f"publish_progress(): WARNING: {exc}, {message}")
+
+
+def subscribe_progress(search_ids):
+    """Return a Redis PubSub object subscribed to the progress events of searches; close it when done.
+
+    Messages' data are JSON objects with `event` and `search_id` keys (see `publish_progress()`).
+
+    Arguments:
+    search_ids -- a list of Search object IDs
+    """
+    pubsub = get_redis_conn().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(*[PROGRESS_CHANNEL.format(search_id=search_id) for search_id in search_ids])
+    return pubsub
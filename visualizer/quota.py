@@ -0,0 +1,130 @@
+"""
+Cluster-wide governor for Scopus API requests.
+
+Every Scopus request, from any worker process or web dyno, goes through `acquire()` before it is
+made and `record()` after it is answered (see `visualizer.scopus_client.ScopusClient`). State is shared
+through Redis:
+- a token bucket per API, which spreads requests out to settings.SCOPUS_REQUESTS_PER_SECOND;
+- the remaining quota and quota reset time per API, as last reported by Scopus, which lets every
+  process stop before it hits 429 TOO MANY REQUESTS and keeps settings.SCOPUS_QUOTA_RESERVE requests
+  in reserve for interactive requests (e.g. a user opening an abstract).
+
+References:
+https://dev.elsevier.com/api_key_settings.html
+"""
+# Standard
+from datetime import datetime
+from time import sleep, time
+
+# 3rd party
+from django.conf import settings
+
+# Internal
+from project.worker import get_redis_conn
+
+# Constants
+QUOTA_KEY = 'visualizer:quota:{api}'
+BUCKET_KEY = 'visualizer:quota:{api}:bucket'
+
+# Take a token from the bucket, refilling it for the time elapsed since it was last touched. Tokens
+# may go negative, in which case the caller waits its turn; the script returns how long (in seconds).
+TOKEN_BUCKET_SCRIPT = '''
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate) - 1
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 60)
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+'''
+
+
+class QuotaExceeded(Exception):
+    """Raised instead of making a Scopus request that would exceed (or eat into the reserve of) the quota."""
+
+    def __init__(self, api, reset_at):
+        """Initialize exception.
+
+        Arguments:
+        api -- a string; the name of the Scopus API (e.g. 'search')
+        reset_at -- a datetime; when the quota resets, if known
+        """
+        super().__init__(f"Scopus {api} quota exceeded, resets at {reset_at}")
+        self.api = api
+        self.reset_at = reset_at
+
+
+#
+# -- Public functions
+#
+
+
+def acquire(api, interactive=False):
+    """Wait until a request to the Scopus API may be made.
+
+    Arguments:
+    api -- a string; the name of the Scopus API (e.g. 'search', 'abstract')
+    interactive -- (optional) a boolean; True if a user is waiting on the request, in which case it may
+        use the quota held in reserve
+    """
+    conn = get_redis_conn()
+
+    # Refuse the request if the quota (or everything but the reserve) has been used up
+    remaining, reset = conn.hmget(QUOTA_KEY.format(api=api), 'remaining', 'reset')
+    if remaining is not None and reset is not None and float(reset) > time():
+        floor = 0 if interactive else settings.SCOPUS_QUOTA_RESERVE
+        if int(remaining) <= floor:
+            raise QuotaExceeded(api, datetime.fromtimestamp(float(reset)))
+
+    # Wait for our turn
+    rate = settings.SCOPUS_REQUESTS_PER_SECOND
+    wait = float(conn.eval(TOKEN_BUCKET_SCRIPT, 1, BUCKET_KEY.format(api=api), rate, max(rate, 1)))
+    if wait > 0:
+        sleep(wait)
+
+
+def get_remaining_quota(api):
+    """Return remaining quota of the Scopus API, as last reported by Scopus, or None if it isn't known
+    (e.g. because no request has been made since the quota last reset).
+
+    Arguments:
+    api -- a string; the name of the Scopus API (e.g. 'search', 'abstract')
+    """
+    remaining, reset = get_redis_conn().hmget(QUOTA_KEY.format(api=api), 'remaining', 'reset')
+    if remaining is None or reset is None or float(reset) <= time():
+        return None
+    return int(remaining)
+
+
+def record(api, response):
+    """Record the remaining quota reported by Scopus in response to a request.
+
+    Arguments:
+    api -- a string; the name of the Scopus API (e.g. 'search', 'abstract')
+    response -- a requests.Response object
+    """
+    remaining = response.headers.get('X-RateLimit-Remaining')
+    reset = response.headers.get('X-RateLimit-Reset')
+
+    # A 429 means the quota is used up, whatever the headers say
+    if response.status_code == 429:
+        remaining = 0
+
+    if remaining is None or reset is None:
+        return
+
+    key = QUOTA_KEY.format(api=api)
+    conn = get_redis_conn()
+    with conn.pipeline() as pipe:
+        pipe.hset(key, mapping={'remaining': int(remaining), 'reset': int(reset)})
+        pipe.expireat(key, int(reset)) # quota information is meaningless once the quota resets
+        pipe.execute()
+
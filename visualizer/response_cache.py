@@ -0,0 +1,86 @@
+"""
+Redis-backed cache of the responses of finished search endpoints.
+
+Once a search has finished, the results that its endpoints report (counts, sources, pages of entries)
+never change, unless the search is deleted or restarted. The responses of each search are cached in a
+Redis hash of their own, one field per endpoint and query string, so that every process (and every
+analyst looking at the same search) shares them and a single DEL forgets all of them at once.
+
+Keys are namespaced by database name, so that processes that share a Redis instance but not a database
+(e.g. a test run and a development server) never serve each other's responses.
+
+Cache failures are logged, never raised; responses are then computed as if nothing had been cached.
+"""
+# Standard
+import json
+
+# 3rd party
+from django.conf import settings
+from django.db import connection
+
+# Internal
+from project.worker import get_redis_conn
+
+# Constants
+RESPONSE_CACHE_KEY = 'visualizer:{database}:search:{search_id}:responses'
+
+
+#
+# -- Public functions
+#
+
+
+def get_cached_response(search_id, field):
+    """Return cached response entry (see `cache_response()`), or None if it isn't cached.
+
+    Arguments:
+    search_id -- a Search object ID
+    field -- a string; identifies the endpoint and query string of the response
+    """
+    try:
+        entry = get_redis_conn().hget(_response_cache_key(search_id), field)
+    except Exception as exc:
+        print(f"get_cached_response(): WARNING: {exc}, {search_id}, {field}")
+        return None
+    return json.loads(entry) if entry else None
+
+
+def cache_response(search_id, field, entry):
+    """Cache response entry; the responses of a search expire together, settings.SEARCH_RESPONSE_CACHE_HRS
+    after the last of them was cached.
+
+    Arguments:
+    search_id -- a Search object ID
+    field -- a string; identifies the endpoint and query string of the response
+    entry -- a JSON-serializable dictionary (e.g. {'etag': ..., 'last_modified': ..., 'content': ...})
+    """
+    key = _response_cache_key(search_id)
+    try:
+        with get_redis_conn().pipeline() as pipe:
+            pipe.hset(key, field, json.dumps(entry))
+            pipe.expire(key, settings.SEARCH_RESPONSE_CACHE_HRS*60*60)
+            pipe.execute()
+    except Exception as exc:
+        print(f"cache_response(): WARNING: {exc}, {search_id}, {field}")
+
+
+def invalidate_search_responses(search_id):
+    """Forget every cached response of a search (e.g. because it was deleted or restarted).
+
+    Arguments:
+    search_id -- a Search object ID
+    """
+    try:
+        get_redis_conn().delete(_response_cache_key(search_id))
+    except Exception as exc:
+        print(f"invalidate_search_responses(): WARNING: {exc}, {search_id}")
+
+
+#
+# -- Private functions
+#
+
+
+def _response_cache_key(search_id):
+    """Return key of the Redis hash that caches the responses of a search."""
+    return RESPONSE_CACHE_KEY.format(database=connection.settings_dict['NAME'], search_id=search_id)
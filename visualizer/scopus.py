@@ -2,39 +2,68 @@
 Scopus API wrappers
 """
 # Standard
-from collections import OrderedDict
-from datetime import datetime
-from time import sleep
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import count
+import queue
+import random
+import threading
 from urllib.parse import quote_plus
 
 # 3rd party
+from django import db
 from django.conf import settings
-from django.db import IntegrityError
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
 import requests
 
 # Internal
+from project.worker import get_redis_conn, queue_job, queue_job_at
 from visualizer.models import (
+    ScopusAbstract,
+    ScopusDocument,
     Search,
+    SearchCheckpoint,
     SearchResult_Category,
     SearchResult_Entry,
+    SearchResult_Source,
     ScopusClassification,
-    ScopusSource,
     CATEGORIES,
     FINISHED_CATEGORIES,
-    NEXT_CATEGORY,
-    NEXT_CURSOR,
 )
+from visualizer.catalog import (
+    get_category_classifications,
+    get_source_categories,
+    get_source_classification_codes,
+    resolve_sources,
+)
+from visualizer.checkpoint import Checkpointer, SearchInterrupted, shutdown_handler
+from visualizer.progress import publish_progress, EVENT_CATEGORY, EVENT_PAGE, EVENT_STATUS
+from visualizer.quota import QuotaExceeded, get_remaining_quota
+from visualizer.scopus_client import ELSEVIER_BASE_URL, get_client
 
 # Constants
-ELSEVIER_BASE_URL = 'http://api.elsevier.com'
-ELSEVIER_HEADERS = {'X-ELS-APIKey': settings.SCOPUS_API_KEY, 'X-ELS-Insttoken': settings.SCOPUS_INST_TOKEN, 'Accept': 'application/json'}
 ELSEVIER_PAGE_LIMIT = 200 # https://dev.elsevier.com/api_key_settings.html
 ELSEVIER_FIRST_CURSOR = '*'
-RETRY_PAUSE = 60
+ELSEVIER_SEARCH_FIELDS = ','.join([ # only the fields of search result entries that we store
+    'dc:identifier', 'dc:title', 'dc:creator', 'prism:doi', 'subtype', 'prism:publicationName', 'source-id',
+])
+ELSEVIER_ABSTRACT_FIELDS = 'dc:description'
+RETRY_PAUSE = 60 # seconds; doubles with each retry
+RETRY_LIMIT = 6
+SEARCH_JOB_TIMEOUT = 12*60*60 # seconds
 STALE_RESULTS_HRS = 24
-AUTHOR_MAX_LENGTH = SearchResult_Entry._meta.get_field('first_author').max_length
-DOCTYPE_MAX_LENGTH = SearchResult_Entry._meta.get_field('document_type').max_length
-DOI_MAX_LENGTH = SearchResult_Entry._meta.get_field('doi').max_length
+ABSTRACT_EVICT_EVERY = 100 # abstracts cached by a process between evictions (see `_evict_abstracts()`)
+PREFETCH_BUDGET_KEY = 'visualizer:search:{search_id}:prefetch' # abstracts prefetched for a search
+SINGLE_PASS_CHECKPOINT = 'ALL' # stands in for a category in the progress checkpoint of a single pass search
+ROLLUP_BATCH_SIZE = 1000
+AUTHOR_MAX_LENGTH = ScopusDocument._meta.get_field('first_author').max_length
+DOCTYPE_MAX_LENGTH = ScopusDocument._meta.get_field('document_type').max_length
+DOI_MAX_LENGTH = ScopusDocument._meta.get_field('doi').max_length
 
 # Scopus Document Types
 # ar - Article
@@ -56,20 +85,25 @@ EXCLUDE_DOCTYPES = ['bk', 'ch', 'ed', 'er', 'le', 'no', 'pr', 're', 'sh']
 DOCTYPES = [dt for dt in ALL_DOCTYPES if dt not in EXCLUDE_DOCTYPES]
 DOCTYPES_QUERY = ' OR '.join(DOCTYPES)
 
+# Count of abstracts cached by this process (see `get_cached_abstract()`)
+_abstracts_cached = count(1)
+
 #
 # -- Public functions
 #
 
 
-def get_abstract(scopus_id):
+def get_abstract(scopus_id, interactive=True):
     """Get abstract for document identified by Scopus ID.
 
     Arguments:
     scopus_id -- a Scopus ID
+    interactive -- (optional) a boolean; False if no user is waiting on the abstract, in which case the
+        request won't eat into the quota held in reserve for users (see `visualizer.quota`)
     """
     # Request Scopus abstract
-    url = f'{ELSEVIER_BASE_URL}/content/abstract/scopus_id/{scopus_id}'
-    response = requests.get(url, headers=ELSEVIER_HEADERS)
+    url = f'{ELSEVIER_BASE_URL}/content/abstract/scopus_id/{scopus_id}?field={ELSEVIER_ABSTRACT_FIELDS}'
+    response = get_client().get(url, interactive=interactive)
 
     # Unpack abstract text
     try:
@@ -85,7 +119,123 @@ def get_abstract(scopus_id):
     return abstract
 
 
-def get_search_results(query, categories=None, search_id=None):
+def get_cached_abstract(scopus_id, interactive=True):
+    """Get abstract for document identified by Scopus ID from the local abstract cache; on a cache miss,
+    get it from Scopus and cache it.
+
+    Abstracts are served from the cache for settings.ABSTRACT_CACHE_TTL_HRS after they are fetched,
+    and the cache holds at most settings.ABSTRACT_CACHE_MAX_ENTRIES abstracts (give or take the
+    ABSTRACT_EVICT_EVERY abstracts each process caches between evictions). Errors raised by
+    `get_abstract()` are not cached.
+
+    Arguments:
+    scopus_id -- a Scopus ID
+    interactive -- (optional) a boolean; see `get_abstract()`
+    """
+    fresh_since = timezone.now() - timedelta(hours=settings.ABSTRACT_CACHE_TTL_HRS)
+
+    # Serve abstract from cache, if possible
+    abstract = ScopusAbstract.objects.filter(scopus_id=scopus_id, modified__gte=fresh_since).values_list(
+        'abstract', flat=True
+    ).first()
+    if abstract is not None:
+        return abstract
+
+    # Otherwise, request abstract from Scopus and cache it (unless it isn't plain text)
+    abstract = get_abstract(scopus_id, interactive=interactive)
+    if isinstance(abstract, str):
+        ScopusAbstract.objects.update_or_create(scopus_id=scopus_id, defaults={'abstract': abstract})
+        if next(_abstracts_cached) % ABSTRACT_EVICT_EVERY == 0:
+            _evict_abstracts(fresh_since)
+
+    return abstract
+
+
+def get_category_counts(search, category):
+    """Return dictionary of search result entry counts for category, as a whole and per classification.
+
+    All counts are computed by a single aggregate query that joins entries to their sources'
+    classifications once and counts each classification with a FILTER clause.
+
+    Arguments:
+    search -- a Search object
+    category -- a string; a scopus category abbreviation (e.g. 'CHEM')
+    """
+    classifications = [(c['code'], c['name']) for c in get_category_classifications(category)]
+
+    # Assemble aggregates; classification codes are prefixed because aliases may not begin with a digit
+    aggregates = {
+        'total': Count('id', distinct=True),
+        ScopusClassification.UNKNOWN: Count('id', distinct=True, filter=SearchResult_Entry.UNCLASSIFIED),
+    }
+    for code, _ in classifications:
+        aggregates[f'code_{code}'] = Count('id', distinct=True, filter=Q(scopus_source__classifications__code=code))
+
+    tallies = SearchResult_Entry.objects.filter(search=search, category_abbr=category).aggregate(**aggregates)
+
+    # Assemble counts in display order: total, classifications, unknown
+    counts = OrderedDict({})
+    counts['total'] = {
+        'name': 'Total',
+        'count': tallies['total'],
+    }
+    for code, name in classifications:
+        counts[code] = {
+            'name': name,
+            'count': tallies[f'code_{code}'],
+        }
+    counts[ScopusClassification.UNKNOWN] = {
+        'name': 'Unknown',
+        'count': tallies[ScopusClassification.UNKNOWN],
+    }
+
+    return counts
+
+
+def build_source_rollups(search, category):
+    """Count the search result entries of category per classification and source, and store the counts
+    as SearchResult_Source records (replacing any previous ones), so that the sources of a classification
+    can be listed largest first without aggregating entries on every request.
+
+    Entries of unknown classification (see `SearchResult_Entry.UNCLASSIFIED`) are counted per publication
+    name, under ScopusClassification.UNKNOWN.
+
+    Arguments:
+    search -- a Search object
+    category -- a string; a scopus category abbreviation (e.g. 'CHEM')
+    """
+    entries = SearchResult_Entry.objects.filter(search=search, category_abbr=category)
+
+    # Classified sources; a source is counted once for each of its classifications within the category
+    classified = entries.filter(
+        scopus_source__classifications__category_abbr=category,
+    ).values(
+        classification_code=F('scopus_source__classifications__code'),
+        source_id=F('scopus_source__source_id'),
+        source_name=F('scopus_source__source_name'),
+    ).annotate(count=Count('id'))
+
+    # Unknown sources (and, under ScopusClassification.UNKNOWN_CATEGORY, unclassified ones)
+    unknown = entries.filter(
+        SearchResult_Entry.UNCLASSIFIED,
+    ).values(
+        source_name=F('publication_name'),
+    ).annotate(count=Count('id'))
+
+    rollups = [SearchResult_Source(search=search, category_abbr=category, **row) for row in classified]
+    rollups += [
+        SearchResult_Source(search=search, category_abbr=category, classification_code=ScopusClassification.UNKNOWN, **row)
+        for row in unknown
+    ]
+
+    with transaction.atomic():
+        SearchResult_Source.objects.filter(search=search, category_abbr=category).delete()
+        SearchResult_Source.objects.bulk_create(rollups, batch_size=ROLLUP_BATCH_SIZE)
+
+    print(f"build_source_rollups(): INFO: {search.query}, {category}, {len(rollups)} rollups")
+
+
+def get_search_results(query, categories=None, search_id=None, concurrency=None, attempt=0, mode=None):
     """Return dictionary of search results for query within the specified subject area categories.
 
     !!!
@@ -110,37 +260,143 @@ def get_search_results(query, categories=None, search_id=None):
         be performed across all categories
     search_id -- (optional) a Search object ID; identifies a Search object that should be used to
         organize search results; when not provided, a new Search object will be created
+    concurrency -- (optional) an integer; the maximum number of categories to search at the same
+        time; defaults to settings.SCOPUS_SEARCH_CONCURRENCY
+    attempt -- (optional) an integer; the number of times the search has been rescheduled because
+        Scopus was unavailable
+    mode -- (optional) a search mode (see `Search.MODES`); used only when a new Search object is
+        created; defaults to settings.SCOPUS_SEARCH_MODE
+
+    Returns None if the search was rescheduled (e.g. because the Scopus quota has run out).
     """
     # Create Search object to link results back to
     if search_id:
         search = Search.objects.get(id=search_id)
         assert query == search.query, f"Query mismatch, {query}, {search.query}"
     else:
-        search = Search.init_search(query, categories)
+        search = Search.init_search(query, categories, mode)
 
     # Log what's about to happen
     search_categories = search.context[CATEGORIES]
     finished_categories = search.context[FINISHED_CATEGORIES]
-    print(f"get_search_results(): INFO: {query}, {search}, {search_categories}, {finished_categories}")
+    print(f"get_search_results(): INFO: {query}, {search}, {search.mode}, {search_categories}, {finished_categories}")
+    publish_progress(search.id, EVENT_STATUS, status='started')
 
     # Assemble list of categories that are not already finished (i.e. still need to be searched);
     # this allows us to pick up an interrupted search where it left off.
     unfinished_categories = [c for c in search_categories if c not in finished_categories]
 
-    # Generate search results for each category; results are stored in the database, not returned
-    for category in unfinished_categories:
-        _search_category(search, category)
+    # Generate search results for each category; results are stored in the database, not returned.
+    # Rather than wait out errors in the worker, reschedule the search to pick up where it left off:
+    # right away if the worker is shutting down, when the quota resets if it has run out, or after a
+    # randomized, exponentially growing pause if Scopus is unavailable.
+    concurrency = concurrency or settings.SCOPUS_SEARCH_CONCURRENCY
+    try:
+        with shutdown_handler():
+            if search.mode == Search.MODE_SINGLE_PASS:
+                if unfinished_categories:
+                    _search_single_pass(search, unfinished_categories)
+            elif concurrency > 1 and len(unfinished_categories) > 1:
+                _search_categories_concurrently(search, unfinished_categories, concurrency)
+            else:
+                for category in unfinished_categories:
+                    _search_category(search, category)
+    except SearchInterrupted as exc:
+        print(f"get_search_results(): INFO: {exc}")
+        _reschedule_search(search, datetime.now(), attempt)
+        return None
+    except QuotaExceeded as exc:
+        reset_at = exc.reset_at or datetime.now() + _retry_pause(attempt)
+        _reschedule_search(search, reset_at + timedelta(seconds=random.uniform(0, RETRY_PAUSE)), attempt)
+        return None
+    except Exception as exc:
+        if not _is_transient_error(exc) or attempt >= RETRY_LIMIT:
+            publish_progress(search.id, EVENT_STATUS, status='failed', error=str(exc))
+            raise exc
+        _reschedule_search(search, datetime.now() + _retry_pause(attempt), attempt + 1)
+        return None
 
     # Assemble results from database for search
-    results = {}
-    for category in search_categories:
-        category_results = SearchResult_Category.objects.filter(search=search, category_abbr=category).first()
-        if category_results:
-            results[category] = category_results.counts
-        else:
-            results[category] = None
+    publish_progress(search.id, EVENT_STATUS, status='finished')
+    return get_search_result_counts(search)
+
+
+def get_search_result_counts(search):
+    """Return dictionary of entry counts for each category of search, as recorded so far.
+
+    Counts are kept up to date while a category is being searched, so this may be used to report on
+    searches that haven't finished; categories that haven't been started are reported as None (see
+    `SearchResult_Category.get_counts()`).
+
+    Arguments:
+    search -- a Search object
+    """
+    return SearchResult_Category.get_counts(search)
+
 
-    return results
+def prefetch_abstracts(search_id, category):
+    """Fetch abstracts into the local abstract cache for the documents that users are most likely to
+    open: the first page of entries of each of the largest sources within a search category.
+
+    !!!
+    IMPORTANT: This task is designed to be queued for an asynchronous worker, at low priority.
+    !!!
+
+    Abstracts are fetched a few at a time (settings.ABSTRACT_PREFETCH_CONCURRENCY) as non-interactive
+    requests, so prefetching stops short of the abstract quota held in reserve for users. Each search
+    may prefetch at most settings.ABSTRACT_PREFETCH_SEARCH_BUDGET abstracts across its categories, and
+    each prefetch at most settings.ABSTRACT_PREFETCH_QUOTA_SHARE of the quota left over the reserve.
+
+    Arguments:
+    search_id -- a Search object ID
+    category -- a string; a scopus category abbreviation (e.g. 'CHEM')
+    """
+    search = Search.objects.filter(id=search_id, deleted=False).first()
+    if not search:
+        return
+
+    # Identify the largest sources within the category
+    sources = SearchResult_Entry.objects.filter(
+        search=search, category_abbr=category, scopus_source__isnull=False
+    ).values('scopus_source').annotate(count=Count('id')).order_by('-count')
+    source_pks = [s['scopus_source'] for s in sources[:settings.ABSTRACT_PREFETCH_SOURCES]]
+
+    # Identify the first page of entries of each source, in the order they are displayed
+    scopus_ids = []
+    for source_pk in source_pks:
+        scopus_ids += SearchResult_Entry.objects.filter(
+            search=search, category_abbr=category, scopus_source_id=source_pk
+        ).order_by('title', 'document').values_list('document_id', flat=True)[:settings.ABSTRACT_PREFETCH_ENTRIES]
+
+    # Skip abstracts that are already cached
+    fresh_since = timezone.now() - timedelta(hours=settings.ABSTRACT_CACHE_TTL_HRS)
+    cached_ids = set(ScopusAbstract.objects.filter(
+        scopus_id__in=scopus_ids, modified__gte=fresh_since
+    ).values_list('scopus_id', flat=True))
+    scopus_ids = [scopus_id for scopus_id in scopus_ids if scopus_id not in cached_ids]
+
+    # Keep within budget; abstracts of the largest sources come first, so they're the ones kept
+    scopus_ids = scopus_ids[:_reserve_prefetch_budget(search, len(scopus_ids))]
+
+    print(f"prefetch_abstracts(): INFO: {search.query}, {category}, {len(source_pks)} sources, {len(scopus_ids)} abstracts")
+
+    def prefetch_abstract(scopus_id):
+        try:
+            get_cached_abstract(scopus_id, interactive=False)
+            return True
+        except QuotaExceeded:
+            # Leave remaining quota to users
+            return False
+        except Exception:
+            # Errors are logged by `get_abstract()`; a missing abstract shouldn't stop the prefetch
+            return False
+        finally:
+            db.connection.close()
+
+    with ThreadPoolExecutor(max_workers=settings.ABSTRACT_PREFETCH_CONCURRENCY) as executor:
+        prefetched = sum(executor.map(prefetch_abstract, scopus_ids))
+
+    print(f"prefetch_abstracts(): INFO: {search.query}, {category}, {prefetched} of {len(scopus_ids)} abstracts prefetched")
 
 
 def get_subject_area_classifications():
@@ -153,7 +409,7 @@ def get_subject_area_classifications():
 
     # Request Scopus subject area classifications
     url = f"{ELSEVIER_BASE_URL}/content/subject/scopus"
-    response = requests.get(url, headers=ELSEVIER_HEADERS)
+    response = get_client().get(url, interactive=True)
     response.raise_for_status()
 
     # Unpack successful response
@@ -187,6 +443,113 @@ def get_subject_area_classifications():
 #
 
 
+def _evict_abstracts(fresh_since):
+    """Delete cached abstracts that have expired and, if the cache is still too big, the oldest abstracts.
+
+    Arguments:
+    fresh_since -- a datetime; abstracts cached before then have expired
+    """
+    ScopusAbstract.objects.filter(modified__lt=fresh_since).delete()
+
+    overflow = ScopusAbstract.objects.count() - settings.ABSTRACT_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        oldest_ids = list(ScopusAbstract.objects.order_by('modified').values_list('scopus_id', flat=True)[:overflow])
+        ScopusAbstract.objects.filter(scopus_id__in=oldest_ids).delete()
+
+
+def _reserve_prefetch_budget(search, wanted):
+    """Return how many abstracts (up to wanted) may be prefetched for search, and count them against the
+    search's prefetch budget (see `prefetch_abstracts()`).
+
+    Arguments:
+    search -- a Search object
+    wanted -- an integer; the number of abstracts that would be prefetched
+    """
+    # Use no more than a small share of the quota left over the reserve, if the quota is known
+    remaining = get_remaining_quota('abstract')
+    if remaining is not None:
+        wanted = min(wanted, int(max(remaining - settings.SCOPUS_QUOTA_RESERVE, 0) * settings.ABSTRACT_PREFETCH_QUOTA_SHARE))
+    if wanted <= 0:
+        return 0
+
+    # Count abstracts against the budget of the search, which its categories' prefetches share
+    key = PREFETCH_BUDGET_KEY.format(search_id=search.id)
+    conn = get_redis_conn()
+    spent = conn.incrby(key, wanted)
+    conn.expire(key, STALE_RESULTS_HRS*60*60)
+    granted = max(0, wanted - max(spent - settings.ABSTRACT_PREFETCH_SEARCH_BUDGET, 0))
+    if granted < wanted:
+        conn.decrby(key, wanted - granted)
+    return granted
+
+
+def _is_transient_error(exc):
+    """Return True if exception was raised because Scopus was (probably briefly) unavailable."""
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code >= 500
+    return False
+
+
+def _retry_pause(attempt):
+    """Return randomized, exponentially growing pause before retry attempt (e.g. 60-120 seconds, then
+    120-180 seconds, then 240-300 seconds, ...)."""
+    return timedelta(seconds=RETRY_PAUSE * 2**attempt + random.uniform(0, RETRY_PAUSE))
+
+
+def _reschedule_search(search, when, attempt):
+    """Queue job for worker to resume search at a later time; record job ID on search object.
+
+    Arguments:
+    search -- a Search object
+    when -- a datetime; when the search should resume
+    attempt -- an integer; see `get_search_results()`
+    """
+    print(f"_reschedule_search(): INFO: {search.query}, {search}, resume at {when}, attempt {attempt}")
+    job = queue_job_at(
+        when,
+        get_search_results,
+        args=(search.query, None, search.id),
+        kwargs={'attempt': attempt},
+        job_timeout=SEARCH_JOB_TIMEOUT,
+    )
+    Search.objects.filter(id=search.id).update(job_id=job.id)
+    publish_progress(search.id, EVENT_STATUS, status='scheduled', resume_at=when, job_id=job.id)
+
+
+def _search_categories_concurrently(search, categories, concurrency):
+    """Perform Scopus searches within several subject area categories at the same time.
+
+    Each category is searched in its own thread, with its own copy of the Search object and its own
+    database connection. If any category search fails, the remaining category searches are allowed
+    to finish before the first exception is raised.
+
+    Arguments:
+    search -- a Search object that defines the parameters of the search
+    categories -- a list of scopus category abbreviations (e.g. ['AGRI','CHEM'])
+    concurrency -- an integer; the maximum number of categories to search at the same time
+    """
+    print(f"_search_categories_concurrently(): INFO: {search.query}, {len(categories)} categories, concurrency {concurrency}")
+
+    def search_category(category):
+        try:
+            _search_category(Search.objects.get(id=search.id), category)
+        finally:
+            # Threads don't share Django's per-thread database connection; close this thread's connection
+            db.connection.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(search_category, category) for category in categories]
+
+    # Raise the first exception encountered, if any
+    for future in futures:
+        future.result()
+
+    # Refresh search object so that it reflects context changes made by each thread
+    search.refresh_from_db()
+
+
 def _search_category(search, category):
     """Perform Scopus search within subject area category; store summarized category results in the database.
 
@@ -194,46 +557,94 @@ def _search_category(search, category):
     search -- a Search object that defines the parameters of the search
     category -- a string; a scopus category abbreviation (e.g. 'CHEM')
     """
+    # Create search results record for category, with counts seeded from any entries already in the
+    # database (e.g. if search of this category was previously interrupted). From here on, counts are
+    # kept up to date as each page of entries is ingested.
+    _init_search_result_categories(search, [category])
+
     # Generate search result entries in database
-    _search_category_entries(search, category)
+    query_url = f'{ELSEVIER_BASE_URL}/content/search/scopus?query=ABS({search.scopus_query}) AND SUBJAREA({category}) AND DOCTYPE({DOCTYPES_QUERY})'
+    _search_entries(search, category, query_url, lambda row: (category,))
 
-    # Summarize results with a dictionary of entry counts
-    counts = OrderedDict({})
-    entries = SearchResult_Entry.objects.filter(search=search, category_abbr=category)
+    # Count entries per source, then mark the category as finished
+    build_source_rollups(search, category)
+    search.finish_category(category)
+    _publish_categories_finished(search, [category])
 
-    # Get entry count for category as a whole
-    counts['total'] = {
-        'name': 'Total',
-        'count': entries.count(),
-    }
+    # Warm the abstract cache for the category's hot drill-down paths, without delaying other searches
+    if settings.ABSTRACT_PREFETCH_SOURCES:
+        queue_job(prefetch_abstracts, args=(search.id, category), queue_name='low')
 
-    # Get entry counts for each classification
-    for classification in ScopusClassification.objects.filter(category_abbr=category):
-        counts[classification.code] = {
-            'name': classification.name,
-            'count': entries.filter(scopus_source__classifications__code=classification.code).count(),
-        }
 
-    # Get entry count for unknown classification
-    counts[ScopusClassification.UNKNOWN] = {
-        'name': 'Unknown',
-        'count': entries.filter(scopus_source__isnull=True).count(),
-    }
+def _search_single_pass(search, categories):
+    """Perform Scopus search across all subject areas at once (or, if only some categories are searched,
+    across their subject areas at once); assign each document to the categories of its source's
+    classifications (see `visualizer.catalog`) rather than have Scopus filter by subject area one category
+    at a time. Documents that belong to several categories are downloaded once rather than once per category.
+
+    Documents whose source is unknown (or unclassified) can't be assigned to a category; they are
+    recorded under ScopusClassification.UNKNOWN_CATEGORY instead, where they can be drilled into by
+    publication name (see `SearchResult_Entry.UNCLASSIFIED`).
 
-    # Create search results record for category
-    SearchResult_Category.objects.update_or_create(
-        search=search,
-        category_abbr=category,
-        defaults={'counts': counts}
+    Arguments:
+    search -- a Search object that defines the parameters of the search
+    categories -- a list of scopus category abbreviations (e.g. ['AGRI','CHEM'])
+    """
+    # Create search results records for categories (and for documents of unknown categories), with
+    # counts seeded from any entries already in the database (see `_search_category()`)
+    _init_search_result_categories(search, categories + [ScopusClassification.UNKNOWN_CATEGORY])
+
+    # Generate search result entries in database; unless every category is searched, only download
+    # documents within the subject areas of the categories searched
+    query_url = f'{ELSEVIER_BASE_URL}/content/search/scopus?query=ABS({search.scopus_query}) AND DOCTYPE({DOCTYPES_QUERY})'
+    if set(categories) != set(ScopusClassification.all_categories()):
+        query_url += f" AND ({' OR '.join(f'SUBJAREA({category})' for category in categories)})"
+    _search_entries(search, SINGLE_PASS_CHECKPOINT, query_url, partial(_assign_categories, set(categories)))
+
+    # Count entries per source (including those of unknown categories), then mark the categories as finished
+    for category in categories + [ScopusClassification.UNKNOWN_CATEGORY]:
+        build_source_rollups(search, category)
+    search.finish_categories(categories)
+    SearchCheckpoint.objects.filter(search=search, category_abbr=SINGLE_PASS_CHECKPOINT).delete()
+    _publish_categories_finished(search, categories)
+
+    # Warm the abstract cache (see `_search_category()`)
+    if settings.ABSTRACT_PREFETCH_SOURCES:
+        for category in categories:
+            queue_job(prefetch_abstracts, args=(search.id, category), queue_name='low')
+
+
+def _publish_categories_finished(search, categories):
+    """Publish progress event for categories of search that have just finished (see `visualizer.progress`)."""
+    publish_progress(
+        search.id, EVENT_CATEGORY, categories=categories,
+        finished_categories=search.context[FINISHED_CATEGORIES], finished=search.finished,
     )
 
-    # Mark the category as finished
-    search.context[FINISHED_CATEGORIES].append(category)
-    search.save()
 
+def _init_search_result_categories(search, categories):
+    """Create (or reset) search results records for categories, with counts of the entries already in the database.
+
+    Arguments:
+    search -- a Search object
+    categories -- a list of scopus category abbreviations (e.g. ['AGRI','CHEM'])
+    """
+    for category in categories:
+        SearchResult_Category.objects.update_or_create(
+            search=search,
+            category_abbr=category,
+            defaults={'counts': get_category_counts(search, category)}
+        )
+
+
+def _search_entries(search, crawl, query_url, assign_categories):
+    """Paginate through Scopus search results; store result entries in the database.
+
+    Pages are fetched ahead of time in a background thread (see `_prefetch_search_results_pages()`),
+    so that fetching the next page overlaps with writing the current one.
 
-def _search_category_entries(search, category):
-    """Perform Scopus search within subject area category; store result entries in the database.
+    Progress is checkpointed every few pages (see `visualizer.checkpoint`), and also before any error
+    (e.g. QuotaExceeded) is raised, so that the rescheduled search doesn't fetch pages again.
 
     References:
     https://dev.elsevier.com/documentation/ScopusSearchAPI.wadl
@@ -243,95 +654,245 @@ def _search_category_entries(search, category):
 
     Arguments:
     search -- a Search object that defines the parameters of the search
-    category -- a string; a scopus category abbreviation (e.g. 'CHEM')
+    crawl -- a string; identifies the crawl in logs and progress checkpoints; a scopus category
+        abbreviation (e.g. 'CHEM') unless searching all categories in a single pass
+    query_url -- a Scopus search URL without pagination markers
+    assign_categories -- a function that returns the categories to record a document under, given its
+        document row (a dictionary keyed by ScopusDocument column names)
     """
     page = 0
-    page_cursor = ELSEVIER_FIRST_CURSOR
-    retry = True
+    category_codes = {} # category -> set of classification codes within category
 
-    # If search of this category was previously interrupted, try to pick up where we left off
-    if category == search.context[NEXT_CATEGORY] and search.context[NEXT_CURSOR]:
-        page_cursor = search.context[NEXT_CURSOR]
+    # Progress (cursor and category counts) is checkpointed every few pages. If the search was
+    # previously interrupted, try to pick up where we left off.
+    checkpointer = Checkpointer(search, crawl)
+    page_cursor = checkpointer.cursor or ELSEVIER_FIRST_CURSOR
 
     # Log start
-    print(f"_search_category_entries(): INFO: {search.query}, {category}, cursor {page_cursor}")
-
-    # Assemble query URL without pagination markers
-    query_url = f'{ELSEVIER_BASE_URL}/content/search/scopus?query=ABS({search.scopus_query}) AND SUBJAREA({category}) AND DOCTYPE({DOCTYPES_QUERY})'
+    print(f"_search_entries(): INFO: {search.query}, {crawl}, cursor {page_cursor}")
 
     #
     # -- Paginate through Scopus search results
     #
 
-    while True:
-        # Add pagination markers to query URL before performing GET request. Use cursor pagination to
-        # "execute deep pagination searching," so as to not be cut off at 5000 results
-        url = f'{query_url}&cursor={page_cursor}&count={ELSEVIER_PAGE_LIMIT}'
-        response = requests.get(url, headers=ELSEVIER_HEADERS)
+    with _prefetch_search_results_pages(search, crawl, query_url, page_cursor) as pages:
         try:
-            response.raise_for_status()
-        except Exception as exc:
-            print(f"_search_category_entries(): ERROR: {exc}, {url}, {response.headers}, {response.content}")
-
-            # If we've exceeded our quota (429 TOO MANY REQUESTS), log reset timestamp before raising exception
-            if response.status_code == 429:
-                quota_reset = response.headers.get('X-RateLimit-Reset')
-                if quota_reset:
-                    print(f"_search_category_entries(): INFO: Quota will reset at {datetime.fromtimestamp(int(quota_reset))}")
-                raise exc
-
-            # Otherwise, retry once before raising exception
-            if retry:
-                print(f"_search_category_issn(): INFO: Will retry in {RETRY_PAUSE} seconds")
-                sleep(RETRY_PAUSE)
-                retry = False
-                continue
+            for url, quota, total, next_cursor, records in pages:
+                # Log status every 5 pages
+                if page % 5 == 0:
+                    print(f"_search_entries(): INFO: {search.query}, {crawl}, {total} results, page {page}, ({quota} HTTP request quota remaining)")
+
+                # If there are no results for the requested page, end pagination
+                if records is None:
+                    print(f"_search_entries(): INFO: {search.query}, {crawl}, page {page}, no entries, end pagination")
+                    checkpointer.flush()
+                    break
 
+                # Create internal search result entries for the page of Scopus result entries
+                created_entries = _create_search_result_entries(search, url, records, assign_categories)
+
+                # Tally counts for the entries that were created, per category
+                tallies = {}
+                for category, rows in created_entries.items():
+                    if category not in category_codes:
+                        category_codes[category] = {c['code'] for c in get_category_classifications(category)}
+                    tallies[category] = Counter()
+                    _tally_search_result_entries(tallies[category], rows, category_codes[category])
+
+                # Move on to next page
+                page_cursor = next_cursor
+                page += 1
+
+                # Now that the page has been written, advance checkpoint past it; let anyone watching know
+                checkpointer.advance(page_cursor, tallies)
+                publish_progress(
+                    search.id, EVENT_PAGE, crawl=crawl, page=checkpointer.pages, total=total,
+                    entries={category: tally['total'] for category, tally in tallies.items()},
+                )
+        except SearchInterrupted as exc:
+            # Progress was checkpointed before the search was interrupted
             raise exc
-
-        # Unpack successful response
-        try:
-            search_results = response.json()['search-results']
-
-            # Log status every 5 pages
-            if page % 5 == 0:
-                quota = response.headers.get('X-RateLimit-Remaining')
-                total = search_results.get('opensearch:totalResults')
-                print(f"_search_category_entries(): INFO: {search.query}, {category}, {total} results, page {page}, ({quota} HTTP request quota remaining)")
-
-            # If there are no results for the requested page, end pagination
-            entries = search_results.get('entry')
-            if not entries:
-                print(f"_search_category_entries(): INFO: {search.query}, {category}, page {page}, no entries, end pagination")
-                break
-
-            # Check for any other errors
-            if 'error' in entries[0]:
-                if 'set was empty' in entries[0]['error']:
-                    print(f"_search_category_entries(): INFO: {search.query}, {category}, page {page}, no entries, end pagination")
-                    break
-                else:
-                    raise Exception(entries[0]['error'])
         except Exception as exc:
-            print(f"_search_category_entries(): ERROR: {exc}, {url}, {response.headers}, {response.json().keys()}")
+            # Every page before the current one has been written, so progress can be checkpointed here too;
+            # the rescheduled search (e.g. once the quota resets) then resumes at the current page, rather
+            # than fetching the pages since the last checkpoint again. Don't let a failed flush (e.g. if the
+            # database went away) hide the original error.
+            try:
+                checkpointer.flush()
+            except Exception as flush_exc:
+                print(f"_search_entries(): WARNING: {search.query}, {crawl}, checkpoint not flushed, {flush_exc}")
             raise exc
 
-        # Create an internal search result entry for each Scopus result entry
-        for entry in entries:
-            _create_search_result_entry(search, category, url, entry)
 
-        # Get next page cursor; set next cursor on search object; increment page counter
+@contextmanager
+def _prefetch_search_results_pages(search, crawl, query_url, page_cursor):
+    """Context manager that follows the cursor chain of a Scopus search in a background thread and
+    yields an iterator over its pages, each a (url, remaining quota, total results, next page cursor,
+    records) tuple (see `_parse_search_results_page()`); the last page has records of None.
+
+    Up to settings.SCOPUS_PREFETCH_PAGES pages are fetched ahead of the page being consumed; beyond
+    that, the background thread waits for room. Any exception raised while fetching a page is raised
+    by the iterator in place of the page. The background thread stops fetching once the context is
+    exited, whether or not every page was consumed.
+
+    Arguments:
+    search -- a Search object that defines the parameters of the search
+    crawl -- a string; identifies the crawl in logs (see `_search_entries()`)
+    query_url -- a Scopus search URL without pagination markers
+    page_cursor -- a string; the cursor of the first page to fetch
+    """
+    pages = queue.Queue(maxsize=max(settings.SCOPUS_PREFETCH_PAGES, 1))
+    stopped = threading.Event()
+
+    def put(item):
+        # Wait for room in the queue, unless the consumer has gone away
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        cursor = page_cursor
         try:
-            page_cursor = quote_plus(search_results['cursor']['@next'])
-            search.set_next_cursor(category, page_cursor)
-            page += 1
+            while True:
+                page = _fetch_search_results_page(search, crawl, query_url, cursor)
+                next_cursor, records = page[3], page[4]
+                if not put(page) or records is None:
+                    return
+                cursor = next_cursor
         except Exception as exc:
-            print(f"_search_category_entries(): ERROR: {exc}, {url}, {response.headers}, {response.json()}")
-            raise exc
+            put(exc)
+
+    def consume():
+        while True:
+            item = pages.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    # The producer never touches the database, so it needs no connection of its own. It isn't joined
+    # on exit, since it may be in the middle of a request; it will notice the consumer is gone and stop
+    # on its own, and as a daemon thread it won't keep the worker alive.
+    producer = threading.Thread(target=produce, name=f'prefetch-{search.id}-{crawl}', daemon=True)
+    producer.start()
+    try:
+        yield consume()
+    finally:
+        stopped.set()
+
+
+def _fetch_search_results_page(search, crawl, query_url, page_cursor):
+    """Fetch and parse a page of Scopus search results; see `_prefetch_search_results_pages()` for
+    the tuple returned.
+
+    Arguments:
+    search -- a Search object that defines the parameters of the search
+    crawl -- a string; identifies the crawl in logs (see `_search_entries()`)
+    query_url -- a Scopus search URL without pagination markers
+    page_cursor -- a string; the cursor of the page
+    """
+    # Add field selection and pagination markers to query URL before performing GET request. Only
+    # request the fields we store. Use cursor pagination to "execute deep pagination searching," so
+    # as to not be cut off at 5000 results
+    url = f'{query_url}&field={ELSEVIER_SEARCH_FIELDS}&cursor={page_cursor}&count={ELSEVIER_PAGE_LIMIT}'
+    response = None
+    try:
+        response = get_client().get(url)
+        response.raise_for_status()
+    except QuotaExceeded as exc:
+        # The quota governor refused the request, so there's nothing to retry until the quota resets
+        print(f"_fetch_search_results_page(): INFO: {exc}")
+        raise exc
+    except Exception as exc:
+        # Response is unavailable if the request itself failed (e.g. timed out)
+        headers, content = getattr(response, 'headers', None), getattr(response, 'content', None)
+        print(f"_fetch_search_results_page(): ERROR: {exc}, {url}, {headers}, {content}")
+
+        # If we've exceeded our quota (429 TOO MANY REQUESTS), log reset timestamp before raising exception
+        if response is not None and response.status_code == 429:
+            quota_reset = response.headers.get('X-RateLimit-Reset')
+            reset_at = quota_reset and datetime.fromtimestamp(int(quota_reset))
+            print(f"_fetch_search_results_page(): INFO: Quota will reset at {reset_at}")
+            raise QuotaExceeded('search', reset_at) from exc
+
+        # Otherwise, let `get_search_results()` decide whether to try again later
+        raise exc
+
+    # Unpack successful response into compact records
+    total, next_cursor, records = _parse_search_results_page(search, crawl, url, response)
+    return (url, response.headers.get('X-RateLimit-Remaining'), total, next_cursor, records)
+
+
+def _assign_categories(categories, row):
+    """Return the categories, among those searched, to record a document under in a single pass search
+    (see `_search_single_pass()`).
+
+    Arguments:
+    categories -- a set of the scopus category abbreviations being searched
+    row -- a dictionary keyed by ScopusDocument column names
+    """
+    source_categories = row['scopus_source_id'] and get_source_categories(row['scopus_source_id'])
+    if not source_categories:
+        return (ScopusClassification.UNKNOWN_CATEGORY,)
+    return [category for category in source_categories if category in categories]
+
+
+def _parse_search_results_page(search, crawl, url, response):
+    """Parse a page of Scopus search results into compact records.
+
+    The response is decoded once, and only the fields we store are kept (see `_clean_search_result_entry()`),
+    so nothing else of the page needs to be held onto while its entries are written.
+
+    Returns a (total results, next page cursor, records) tuple; records is None if the page is empty
+    (i.e. pagination has ended).
+
+    Arguments:
+    search -- a Search object that defines the parameters of the search
+    crawl -- a string; identifies the crawl in logs (see `_search_entries()`)
+    url -- the Scopus search URL used to fetch the page
+    response -- a requests.Response object
+    """
+    payload = None
+    try:
+        payload = response.json()
+        search_results = payload['search-results']
+        total = int(search_results.get('opensearch:totalResults') or 0)
+
+        # Check for an empty page, or any other errors
+        entries = search_results.get('entry')
+        if not entries:
+            return (total, None, None)
+        if 'error' in entries[0]:
+            if 'set was empty' in entries[0]['error']:
+                return (total, None, None)
+            raise Exception(entries[0]['error'])
+
+        next_cursor = quote_plus(search_results['cursor']['@next'])
+    except Exception as exc:
+        keys = list(payload.get('search-results', payload)) if isinstance(payload, dict) else None
+        print(f"_parse_search_results_page(): ERROR: {exc}, {url}, {response.headers}, {keys}")
+        raise exc
+
+    # Clean entries; skip any that can't be recorded
+    records = [_clean_search_result_entry(search, crawl, url, entry) for entry in entries]
+    return (total, next_cursor, [record for record in records if record])
+
+
+def _create_search_result_entries(search, url, records, assign_categories):
+    """Create internal search result entries for a page of Scopus search result entries.
 
+    The page's sources are resolved without touching the database (see `visualizer.catalog`), and
+    its documents and entries are each written with a single statement.
+    Documents that are already stored (e.g. found by an earlier search) are left as they are; entries
+    that have already been recorded for this search and category are skipped. Each entry records the
+    source of its document as resolved for this search, so a later search that resolves a source that
+    was unknown (e.g. after `populate_database` added it) never changes the results of this one.
 
-def _create_search_result_entry(search, category, url, entry):
-    """Create an internal search result entry for Scopus search result entry.
+    Returns dictionary mapping category to the list of document rows (dictionaries keyed by ScopusDocument
+    column names) for which entries were created.
 
     References:
     https://dev.elsevier.com/documentation/ScopusSearchAPI.wadl
@@ -339,13 +900,103 @@ def _create_search_result_entry(search, category, url, entry):
 
     Arguments:
     search -- a Search object that defines the parameters of the search
-    category -- a string; a scopus category abbreviation (e.g. 'CHEM')
-    entry -- a Scopus result entry retrieved via the Scopus search API
+    url -- the Scopus search URL used to fetch the entries
+    records -- a list of cleaned Scopus result entries (see `_parse_search_results_page()`)
+    assign_categories -- a function that returns the categories to record a document under, given its
+        document row
+    """
+    if not records:
+        return {}
+
+    # Resolve Scopus sources for the whole page at once, from the in-process catalog
+    source_ids = {entry['source_id'] for entry in records}
+    source_pks = resolve_sources(source_ids)
+
+    # Assemble document rows; skip documents that appear more than once in the page
+    document_rows = {}
+    for entry in records:
+        document_rows.setdefault(entry['scopus_id'], {
+            'scopus_id': entry['scopus_id'],
+            'doi': entry['doi'],
+            'title': entry['title'],
+            'first_author': entry['first_author'],
+            'document_type': entry['document_type'],
+            'publication_name': entry['publication_name'],
+            'scopus_source_id': source_pks.get(entry['source_id']),
+        })
+
+    # Assign documents to categories; skip entries that were already recorded (e.g. before the search
+    # was interrupted), so that only created entries are returned
+    recorded = set(SearchResult_Entry.objects.filter(
+        search=search, document_id__in=list(document_rows)
+    ).values_list('category_abbr', 'document_id'))
+    created_entries = {}
+    for scopus_id, row in document_rows.items():
+        for category in assign_categories(row):
+            if (category, scopus_id) not in recorded:
+                created_entries.setdefault(category, []).append(row)
+    if not created_entries:
+        return {}
+
+    # Assemble rows for the documents and entries to be written
+    document_rows = list({row['scopus_id']: row for rows in created_entries.values() for row in rows}.values())
+    entry_rows = [{
+        'search_id': search.id,
+        'category_abbr': category,
+        'document_id': row['scopus_id'],
+        'scopus_source_id': row['scopus_source_id'],
+        'title': row['title'],
+        'publication_name': row['publication_name'],
+    } for category, rows in created_entries.items() for row in rows]
+
+    # Write rows; documents first, so that entries can refer to them
+    try:
+        ScopusDocument.objects.bulk_create([ScopusDocument(**row) for row in document_rows], ignore_conflicts=True)
+        SearchResult_Entry.objects.bulk_create([SearchResult_Entry(**row) for row in entry_rows], ignore_conflicts=True)
+    except Exception as exc:
+        print(f"_create_search_result_entries(): ERROR: {exc}, {url}")
+        raise exc
+
+    return created_entries
+
+
+def _tally_search_result_entries(tally, rows, category_codes):
+    """Add counts for newly created search result entries to tally.
+
+    Arguments:
+    tally -- a Counter keyed like SearchResult_Category.counts (e.g. 'total', '1602', 'unknown')
+    rows -- a list of dictionaries keyed by ScopusDocument column names
+    category_codes -- a set of the classification codes within the entries' category
+    """
+    for row in rows:
+        tally['total'] += 1
+        # Entries of ScopusClassification.UNKNOWN_CATEGORY, which has no classifications, are all of
+        # unknown classification (see `SearchResult_Entry.UNCLASSIFIED`)
+        if row['scopus_source_id'] is None or not category_codes:
+            tally[ScopusClassification.UNKNOWN] += 1
+        else:
+            for code in get_source_classification_codes(row['scopus_source_id']):
+                if code in category_codes:
+                    tally[code] += 1
+
+
+def _clean_search_result_entry(search, crawl, url, entry):
+    """Return dictionary of cleaned fields for Scopus search result entry, or None if the entry should
+    be skipped.
+
+    Arguments:
+    search -- a Search object that defines the parameters of the search
+    crawl -- a string; identifies the crawl in logs (see `_search_entries()`)
     url -- the Scopus search URL used to fetch the entry
+    entry -- a Scopus result entry retrieved via the Scopus search API
     """
     try:
+        # Skip entry if dc:title or source-id are missing
+        if 'dc:title' not in entry or 'source-id' not in entry:
+            return None
+
         # Clean scopus ID
-        scopus_id = entry['dc:identifier'].replace('SCOPUS_ID:','')
+        scopus_id = int(entry['dc:identifier'].replace('SCOPUS_ID:',''))
 
         # Clean DOI
         doi = entry.get('prism:doi') or None
@@ -357,35 +1008,24 @@ def _create_search_result_entry(search, category, url, entry):
 
         # Sanity check subtype
         if subtype in EXCLUDE_DOCTYPES:
-            print(f"_create_search_result_entry(): WARNING: {search.query}, {category}, "+
+            print(f"_clean_search_result_entry(): WARNING: {search.query}, {crawl}, "+
                 f"entry ignored ({scopus_id}, {doi}, {subtype})")
-            return
+            return None
 
         # Clean first author (creator)
         creator = entry.get('dc:creator') or ''
         creator = creator[:AUTHOR_MAX_LENGTH] if creator else None
 
-        # Create database record for entry
-        try:
-            SearchResult_Entry.objects.create(
-                search=search,
-                category_abbr=category,
-                scopus_id=scopus_id,
-                doi=doi,
-                title=entry['dc:title'],
-                first_author=creator,
-                document_type=subtype,
-                publication_name=entry.get('prism:publicationName'),
-                scopus_source=ScopusSource.objects.filter(source_id=entry['source-id']).first(),
-            )
-        except (IntegrityError, KeyError):
-            # 1. We get here if the creation attempt violates the following unique constraint:
-            #      unique_together = [('search', 'category_abbr', 'scopus_id')]
-            #    We ignore this error because the document has already been recorded in the
-            #    search results for this category. Let's get on with life.
-            # 2. We get here if dc:title or source-id are missing; skip entry
-            pass
+        return {
+            'scopus_id': scopus_id,
+            'doi': doi,
+            'title': entry['dc:title'],
+            'first_author': creator,
+            'document_type': subtype,
+            'publication_name': entry.get('prism:publicationName'),
+            'source_id': int(entry['source-id']),
+        }
 
     except Exception as exc:
-        print(f"_create_search_result_entry(): ERROR: {exc}, {url}, {entry}")
+        print(f"_clean_search_result_entry(): ERROR: {exc}, {url}, {entry}")
         raise exc
@@ -0,0 +1,156 @@
+"""
+Pooled HTTP clients for the Scopus APIs
+
+References:
+https://dev.elsevier.com/api_docs.html
+https://requests.readthedocs.io/en/latest/user/advanced/#session-objects
+"""
+# Standard
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import os
+import threading
+from urllib.parse import urlsplit
+
+# 3rd party
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+
+# Internal
+from visualizer import quota
+
+# Constants
+ELSEVIER_BASE_URL = 'http://api.elsevier.com'
+ELSEVIER_HEADERS = {
+    'X-ELS-APIKey': settings.SCOPUS_API_KEY,
+    'X-ELS-Insttoken': settings.SCOPUS_INST_TOKEN,
+    'Accept': 'application/json',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+# Process-wide client (see `get_client()`)
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+#
+# -- Clients
+#
+
+
+class ScopusClient(object):
+    """Synchronous Scopus client that reuses pooled, keep-alive connections across requests.
+
+    A single client may be shared by several threads (e.g. categories searched concurrently);
+    `pool_size` should be at least the number of threads expected to make requests at once.
+    """
+
+    def __init__(self, timeout=None, pool_size=None):
+        """Initialize client.
+
+        Arguments:
+        timeout -- (optional) a (connect, read) tuple of seconds; defaults to settings.SCOPUS_CONNECT_TIMEOUT
+            and settings.SCOPUS_READ_TIMEOUT
+        pool_size -- (optional) an integer; the maximum number of connections to keep alive per host;
+            defaults to settings.SCOPUS_HTTP_POOL_SIZE
+        """
+        self.timeout = timeout or (settings.SCOPUS_CONNECT_TIMEOUT, settings.SCOPUS_READ_TIMEOUT)
+        self.pool_size = pool_size or settings.SCOPUS_HTTP_POOL_SIZE
+
+        # Session keeps connections alive between requests; adapter pools them
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session = requests.Session()
+        self.session.headers.update(ELSEVIER_HEADERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get(self, url, interactive=False, **kwargs):
+        """Perform GET request against url, once the cluster-wide quota governor allows it (see
+        `visualizer.quota`); raise QuotaExceeded if it won't.
+
+        Arguments:
+        url -- a Scopus API URL
+        interactive -- (optional) a boolean; True if a user is waiting on the request
+        (remaining keyword arguments are passed to `requests.get()`)
+        """
+        api = _api_name(url)
+        quota.acquire(api, interactive=interactive)
+
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.get(url, **kwargs)
+
+        # Share remaining quota with every other process; each Scopus API has its own quota
+        quota.record(api, response)
+
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncScopusClient(object):
+    """Asyncio flavor of ScopusClient.
+
+    Requests are performed by a pooled ScopusClient on a bounded set of threads, so coroutines can
+    issue many Scopus requests at once without opening more than `pool_size` connections.
+    """
+
+    def __init__(self, timeout=None, pool_size=None):
+        """Initialize client. See `ScopusClient.__init__()` for arguments."""
+        self._client = ScopusClient(timeout=timeout, pool_size=pool_size)
+        self._executor = ThreadPoolExecutor(max_workers=self._client.pool_size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    async def get(self, url, **kwargs):
+        """Perform GET request against url. See `ScopusClient.get()` for arguments."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self._client.get, url, **kwargs))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._client.close()
+
+
+#
+# -- Public functions
+#
+
+
+def get_client():
+    """Return the process-wide ScopusClient, creating it if necessary.
+
+    RQ forks a work horse for each job, so the client is recreated in any process other than the one
+    that created it; connections must not be shared across a fork.
+    """
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = ScopusClient()
+            _client_pid = os.getpid()
+        return _client
+
+
+#
+# -- Private functions
+#
+
+
+def _api_name(url):
+    """Return name of the Scopus API that url belongs to (e.g. 'search' for '/content/search/scopus?...')."""
+    path = urlsplit(url).path.strip('/').split('/')
+    return path[1] if len(path) > 1 else path[0]
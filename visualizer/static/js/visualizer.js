@@ -10,6 +10,8 @@ import BarChart from './partials/bar_chart'
 
 // Constants
 const LIMIT = 100
+const SOURCES_LIMIT = 500 // We can only chart so many data points
+const UNKNOWN_CATEGORY = 'UNKN' // see ScopusClassification.UNKNOWN_CATEGORY
 
 const app = createApp({
   delimiters: ['${', '}'],
@@ -30,16 +32,20 @@ const app = createApp({
       classification: null,
       entry: null,
       entries: [],
-      entriesOffset: 0,
+      entriesNext: null, // cursor of the next page of entries, if any
       errors: [],
       fetchingMore: false,
       minNodeSize: 18,
+      progressSource: null, // EventSource that streams progress of pending searches
       nodeSizeMultiplier: 40,
       query: null,
       results: {},
       search: null,
       searchesCompleted: null, // begin with null to distinguish from [], which indicates "no old searches"
+      searchesCompletedFilter: '',
+      searchesCompletedNext: null, // cursor of the next page of completed searches, if any
       searchesPending: [],
+      searchesProgress: {}, // latest page ingested by each pending search, keyed by search ID
       searchResults: null,
       searchResultSources: {},
       source: null,
@@ -72,6 +78,7 @@ const app = createApp({
 
   destroyed: function() {
     window.removeEventListener("beforeunload", this.beforeUnloadWarning)
+    if (this.progressSource) this.progressSource.close()
   },
 
   // 
@@ -88,8 +95,11 @@ const app = createApp({
     loadingSearchResults() {
       return this.searchResults == null
     },
+    pendingSearchIds() {
+      return this.searchesPending.map(s => s.id).join(',')
+    },
     moreEntries() {
-      return this.entries ? this.entriesCount > this.entries.length : false
+      return this.entriesNext != null
     },
     networkGraphEventHandlers() {
       // Event handlers for network graph
@@ -118,6 +128,9 @@ const app = createApp({
   //
 
   watch: {
+    pendingSearchIds(newIds, oldIds) {
+      this.subscribeToProgress()
+    },
     search(newSearch, oldSearch) {
       if (newSearch) {
         if (newSearch.id) {
@@ -161,6 +174,49 @@ const app = createApp({
       }
     },
 
+    // Subscribe to progress events of pending searches, replacing any existing subscription
+    subscribeToProgress() {
+      if (this.progressSource) this.progressSource.close()
+      this.progressSource = null
+      if (!this.searchesPending.length) return
+
+      let source = new EventSource('/search-progress?' + this.searchesPending.map(s => `search=${s.id}`).join('&'))
+      // Current state of a search; sent whenever the stream (re)connects
+      source.addEventListener('search', (event) => {
+        this.updatePendingSearch(JSON.parse(event.data))
+      })
+      // A page of search results was ingested
+      source.addEventListener('page', (event) => {
+        let data = JSON.parse(event.data)
+        this.searchesProgress = {...this.searchesProgress, [data.search_id]: `${data.crawl}, page ${data.page}`}
+      })
+      // One or more categories finished
+      source.addEventListener('category', (event) => {
+        let data = JSON.parse(event.data)
+        this.updatePendingSearch({id: data.search_id, finished_categories: data.finished_categories, finished: data.finished})
+      })
+      // The search started, was rescheduled, finished or failed
+      source.addEventListener('status', (event) => {
+        let data = JSON.parse(event.data)
+        let search = this.searchesPending.find(s => s.id == data.search_id)
+        if (search) this.updatePendingSearch({id: search.id, job: {...search.job, status: data.status}})
+      })
+      this.progressSource = source
+    },
+
+    updatePendingSearch(update) {
+      let search = this.searchesPending.find(s => s.id == update.id)
+      if (!search) return
+      search = {...search, ...update}
+      if (search.finished) {
+        // Move finished search over to completed searches
+        this.searchesPending = this.searchesPending.filter(s => s.id != search.id)
+        this.searchesCompleted = [search, ...(this.searchesCompleted || [])]
+      } else {
+        this.searchesPending = this.searchesPending.map(s => (s.id == search.id) ? search : s)
+      }
+    },
+
     resetSearchResults() {
       this.searchResults = null
       this.category = null
@@ -207,6 +263,7 @@ const app = createApp({
     },
 
     categoryName(category) {
+      if (category == UNKNOWN_CATEGORY) return 'Unknown' // documents of single pass searches that couldn't be categorized
       return this.categories[category] ? this.categories[category].name : category
     },
 
@@ -266,7 +323,7 @@ const app = createApp({
         // classification, a specific category, or for all categories
         if (category && key == 'total') continue
         let count = category ? obj.count : obj.total.count
-        let label = category ? obj.name : this.categories[key].name
+        let label = category ? obj.name : this.categoryName(key)
         let vizId = key
         // Add node to list
         nodes.push({ 
@@ -308,7 +365,7 @@ const app = createApp({
       let counts = []
       let colors = []
       for (let result of results) {
-        vizIds.push(result.id || result.name)
+        vizIds.push(result.other ? null : result.id || result.name)
         labels.push(result.name)
         counts.push(result.count)
         colors.push(this.getLabelColor(result.name))
@@ -378,6 +435,7 @@ const app = createApp({
     },
 
     enterSource(source) {
+      if (source == null) return // e.g. the "other" sources bar
       this.source = source
       this.fetchSearchEntries(this.search.id, this.category, this.classification, this.source, true)
     },
@@ -406,7 +464,7 @@ const app = createApp({
     // 
 
     async fetchSubjectAreaClassifications() {
-      let response = await internalGet('/subject-area-classifications?cached=true')
+      let response = await internalGet('/subject-area-classifications')
       if (response) {
         this.categories = response.categories
       }
@@ -416,10 +474,18 @@ const app = createApp({
       // Unpack options
       let searchId = opts.searchId || null
       let pending = opts.pending || false
+      let cursor = opts.cursor || null
       // Reset state of search results (if we're fetching a specific set of search results)
       if (searchId) this.resetSearchResults()
+      // Assemble URL; completed searches are fetched a page at a time, optionally filtered by query
+      let url = '/search-results' + (searchId ? `/${searchId}` : '')
+      if (pending) {
+        url += '?pending=true'
+      } else if (!searchId) {
+        url += `?q=${encodeURIComponent(this.searchesCompletedFilter)}` + (cursor ? `&cursor=${cursor}` : '')
+      }
       // Fetch data
-      let response = await internalGet('/search-results' + (searchId ? `/${searchId}` : '') + (pending ? `?pending=true` : ''))
+      let response = await internalGet(url)
       if (response) {
         if (searchId) {
           this.searchResults = response.results
@@ -432,19 +498,29 @@ const app = createApp({
         } else if (pending) {
           this.searchesPending = response.results
         } else {
-          this.searchesCompleted = response.results
+          this.searchesCompleted = cursor ? [...this.searchesCompleted, ...response.results] : response.results
+          this.searchesCompletedNext = response.next
         }
       } else {
         this.errors.push(`Failed to retrieve existing search results`)
       }
     },
 
+    async fetchMoreSearchResults() {
+      await this.fetchSearchResults({cursor: this.searchesCompletedNext})
+    },
+
     async startSearch(query, categories=null) {
       // Fetch data
       let data = {query: query, categories: categories} // if categories is null, all categories will be searched
       let response = await internalPost('/search', data)
       if (response) {
-        this.searchesPending.unshift(response.search)
+        if (response.search.finished) {
+          // Fresh results for the same search already exist; visualize them right away
+          this.search = response.search
+        } else if (!this.searchesPending.find(s => s.id == response.search.id)) {
+          this.searchesPending.unshift(response.search)
+        }
       } else {
         this.errors.push(`Failed to retrieve new search results`)
       }
@@ -464,12 +540,16 @@ const app = createApp({
 
     async fetchSearchSources(searchId, category, classification) {
       // Fetch data
-      let response = await internalGet(`/search-results/${searchId}/sources?category=${category}&classification=${classification}`)
+      let response = await internalGet(`/search-results/${searchId}/sources?category=${category}&classification=${classification}&limit=${SOURCES_LIMIT}`)
       if (response) {
+        // Sources come largest first; chart the rest of them as a single bar that can't be clicked
         let results = response.results || []
+        if (response.other) {
+          results = [...results, {id: null, name: `Other (${response.other.sources} sources)`, count: response.other.count, other: true}]
+        }
         this.searchResultSources = {
             ...this.searchResultSources,
-            [classification]: results.sort((a,b) => b.count - a.count).slice(0,500) // We can only chart so many data points
+            [classification]: results,
         }
       } else {
         this.errors.push(`Failed to retrieve sources`)
@@ -477,19 +557,18 @@ const app = createApp({
     },
 
     async fetchSearchEntries(searchId, category, classification, source, reset=false) {
-      const offset = reset ? 0 : this.entriesOffset
-      // Fetch data
-      let url = `/search-results/${searchId}/entries?category=${category}&classification=${classification}&source=${source}&limit=${LIMIT}&offset=${offset}`
+      // Fetch data; unless starting over, fetch the page after the last one fetched
+      let url = `/search-results/${searchId}/entries?category=${category}&classification=${classification}&source=${encodeURIComponent(source)}&limit=${LIMIT}`
+      if (!reset && this.entriesNext) url += `&cursor=${this.entriesNext}`
       let response = await internalGet(url)
       if (response) {
-        // TODO: comment
+        // Replace entries when starting over; otherwise, append the page to entries fetched so far
         if (reset) {
           this.entries = response.results
-          this.entriesOffset = LIMIT
         } else {
           this.entries = [...this.entries, ...response.results]
-          this.entriesOffset += LIMIT
         }
+        this.entriesNext = response.next
         this.entriesCount = response.count
       } else {
         this.errors.push(`Failed to retrieve entries`)
@@ -1,20 +1,648 @@
-from django.contrib.auth.models import AnonymousUser, User
-from django.test import TestCase, RequestFactory
+"""
+Tests for the visualizer app.
 
-from .views import index
+Query plan tests EXPLAIN the queries that drill-down views actually execute, against a seeded dataset,
+and fail if any of them reads one of the large tables with a sequential scan (i.e. if no index serves
+the query). Paging tests follow the keyset cursors of search result entries across documents that share
+titles. Ingestion tests write pages of search results that overlap with documents and entries already
+stored. Checkpoint tests interrupt a category search partway through a fake crawl of Scopus search
+results, resume it, and check that every entry is recorded and counted exactly once. Response cache tests
+request the results of searches through a fake Redis, and check which responses are cached, revalidated
+and forgotten.
 
+All need PostgreSQL, as in production, and are skipped on other databases.
+"""
+# Standard
+import re
+import threading
+from unittest import mock, skipUnless
 
-# TODO:
-# class SimpleTest(TestCase):
-#     def setUp(self):
-#         # Every test needs access to the request factory.
-#         self.factory = RequestFactory()
+# 3rd party
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+import fakeredis
 
-#     def test_details(self):
-#         # Create an instance of a GET request.
-#         request = self.factory.get("/")
-#         request.user = AnonymousUser()
+# Internal
+from visualizer.catalog import load_catalog
+from visualizer.checkpoint import SearchInterrupted, _shutdown
+from visualizer.models import (
+    ScopusClassification,
+    ScopusDocument,
+    ScopusSource,
+    Search,
+    SearchCheckpoint,
+    SearchResult_Category,
+    SearchResult_Entry,
+    SearchResult_Source,
+)
+from visualizer.progress import EVENT_PAGE
+from visualizer.quota import QuotaExceeded
+from visualizer.response_cache import _response_cache_key
+from visualizer.scopus import (
+    ELSEVIER_FIRST_CURSOR,
+    _create_search_result_entries,
+    _search_category,
+    build_source_rollups,
+    get_category_counts,
+)
 
-#         # Test my_view() as if it were deployed at /customer/details
-#         response = index(request)
-#         self.assertEqual(response.status_code, 200)
+# Constants
+LARGE_TABLES = [
+    ScopusDocument._meta.db_table,
+    ScopusSource._meta.db_table,
+    ScopusSource.classifications.through._meta.db_table,
+    SearchResult_Entry._meta.db_table,
+    SearchResult_Source._meta.db_table,
+]
+SEED_CATEGORIES = ['CHEM', 'PHYS']
+SEED_SOURCES = 200
+SEED_DOCUMENTS = 5000
+PAGING_DOCUMENTS = 23
+PAGING_LIMIT = 4
+CRAWL_PAGES = 6
+CRAWL_PAGE_SIZE = 5
+
+
+class WorkerKilled(BaseException):
+    """Stands in for the worker being killed outright (e.g. SIGKILL), when no exception handler runs."""
+
+
+def make_entry(search, category, document):
+    """Return unsaved search result entry of document, as ingestion would record it."""
+    return SearchResult_Entry(
+        search=search, category_abbr=category, document=document, scopus_source=document.scopus_source,
+        title=document.title, publication_name=document.publication_name,
+    )
+
+
+class SeededTestCase(TestCase):
+    """Test case with a seeded catalog of classifications and sources, kept clear of Redis."""
+
+    @classmethod
+    def setUpClass(cls):
+        # Keep Redis out of the tests; the catalog is loaded once the fixture is seeded and never changes,
+        # and responses are never cached, so that every request runs the queries under test
+        cls.patchers = [
+            mock.patch('visualizer.catalog.get_catalog_version', return_value=0),
+            mock.patch('visualizer.views.get_cached_response', return_value=None),
+            mock.patch('visualizer.views.cache_response'),
+        ]
+        for patcher in cls.patchers:
+            patcher.start()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for patcher in cls.patchers:
+            patcher.stop()
+
+    @classmethod
+    def setUpTestData(cls):
+        # Classifications; two per category
+        classifications = []
+        for category in SEED_CATEGORIES:
+            for i in range(2):
+                classifications.append(ScopusClassification.objects.create(
+                    code=f'{len(classifications) + 1600}', name=f'{category} {i}',
+                    category_abbr=category, category_name=category,
+                ))
+        cls.classification = classifications[0]
+
+        # Sources, each assigned to one or two classifications
+        ScopusSource.objects.bulk_create([
+            ScopusSource(source_id=21100000000 + i, source_name=f'Source {i}') for i in range(SEED_SOURCES)
+        ])
+        sources = list(ScopusSource.objects.order_by('id'))
+        through = ScopusSource.classifications.through
+        through.objects.bulk_create([
+            through(scopussource_id=source.id, scopusclassification_id=classifications[(i + j) % len(classifications)].id)
+            for i, source in enumerate(sources) for j in range(1 + i % 2)
+        ])
+        cls.sources = sources
+        cls.source = sources[0]
+        load_catalog(force=True)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are specific to PostgreSQL')
+class DrillDownQueryPlanTests(SeededTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        sources = cls.sources
+
+        # Documents; one in ten is published by an unknown source
+        documents = ScopusDocument.objects.bulk_create([
+            ScopusDocument(
+                scopus_id=85000000000 + i,
+                title=f'Title {i % 997} {i}',
+                publication_name=f'Publication {i % 50}',
+                scopus_source=None if i % 10 == 0 else sources[i % SEED_SOURCES],
+            ) for i in range(SEED_DOCUMENTS)
+        ])
+        cls.publication_name = 'Publication 0'
+        cls.source = sources[4] # classified in cls.classification; publishes documents 4, 204, 404, ...
+
+        # A finished search that found every document in every category
+        cls.search = Search.objects.create(query='plan', context={
+            'categories': SEED_CATEGORIES, 'finished_categories': SEED_CATEGORIES,
+        })
+        for category in SEED_CATEGORIES:
+            SearchResult_Category.objects.create(search=cls.search, category_abbr=category, counts={})
+        SearchResult_Entry.objects.bulk_create([
+            make_entry(cls.search, category, document) for category in SEED_CATEGORIES for document in documents
+        ])
+        for category in SEED_CATEGORIES:
+            build_source_rollups(cls.search, category)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        # Make sequential scans a last resort, so that a table is only scanned if no index can serve
+        # the query; the setting is rolled back with each test's transaction
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    #
+    # -- Tests
+    #
+
+    def test_sources_of_classification(self):
+        self.assertIndexed('visualizer:search_result_sources', {
+            'category': self.classification.category_abbr, 'classification': self.classification.code,
+        }, 'visualizer_source_rollup_top')
+
+    def test_sources_of_unknown_classification(self):
+        self.assertIndexed('visualizer:search_result_sources', {
+            'category': self.classification.category_abbr, 'classification': ScopusClassification.UNKNOWN,
+        }, 'visualizer_source_rollup_top')
+
+    def test_top_sources(self):
+        response = self.assertIndexed('visualizer:search_result_sources', {
+            'category': self.classification.category_abbr, 'classification': self.classification.code, 'limit': 10,
+        }, 'visualizer_source_rollup_top')
+        sources = response.json()
+        counts = [source['count'] for source in sources['results']]
+        self.assertEqual(len(counts), 10)
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertEqual(sum(counts) + sources['other']['count'], SearchResult_Entry.objects.filter(
+            search=self.search, category_abbr=self.classification.category_abbr,
+            scopus_source__classifications=self.classification,
+        ).count())
+
+    def test_entries_of_source(self):
+        params = {
+            'category': self.classification.category_abbr, 'classification': self.classification.code,
+            'source': self.source.source_id, 'limit': 10,
+        }
+        response = self.assertIndexed('visualizer:search_result_entries', params, 'visualizer_entry_source_title')
+        response = self.assertIndexed('visualizer:search_result_entries', {
+            **params, 'cursor': response.json()['next'],
+        }, 'visualizer_entry_source_title')
+        self.assertIndexed('visualizer:search_result_entries', {
+            **params, 'cursor': response.json()['previous'],
+        }, 'visualizer_entry_source_title')
+
+    def test_entries_of_unknown_source(self):
+        params = {
+            'category': self.classification.category_abbr, 'classification': ScopusClassification.UNKNOWN,
+            'source': self.publication_name, 'limit': 10,
+        }
+        response = self.assertIndexed('visualizer:search_result_entries', params, 'visualizer_entry_unknown_title')
+        self.assertTrue(all(entry['scopus_source_id'] is None for entry in response.json()['results']))
+        response = self.assertIndexed('visualizer:search_result_entries', {
+            **params, 'cursor': response.json()['next'],
+        }, 'visualizer_entry_unknown_title')
+        self.assertIndexed('visualizer:search_result_entries', {
+            **params, 'cursor': response.json()['previous'],
+        }, 'visualizer_entry_unknown_title')
+
+    def test_category_counts(self):
+        with CaptureQueriesContext(connection) as context:
+            get_category_counts(self.search, self.classification.category_abbr)
+        plans = self.assertNoSeqScans(context.captured_queries)
+
+        # Entries are looked up by an index that leads with (search, category)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, SearchResult_Entry._meta.db_table)
+        indexes = [
+            name for name, constraint in constraints.items()
+            if constraint['columns'][:2] == ['search_id', 'category_abbr']
+        ]
+        self.assertUsesIndex(plans, '|'.join(indexes))
+
+    def test_search_result_counts(self):
+        with self.assertNumQueries(1):
+            counts = SearchResult_Category.get_counts(self.search)
+        self.assertEqual(list(counts), SEED_CATEGORIES)
+
+    #
+    # -- Helpers
+    #
+
+    def assertIndexed(self, url_name, params, index):
+        """GET view with query params; assert that none of its queries scans a large table sequentially
+        or sorts rows, and that the named index serves at least one of them."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(url_name, args=[self.search.id]), params)
+        self.assertEqual(response.status_code, 200)
+        plans = self.assertNoSeqScans(context.captured_queries)
+        self.assertUsesIndex(plans, index)
+        return response
+
+    def assertNoSeqScans(self, queries):
+        """Assert that none of the SELECT queries scans a large table sequentially and that none of the
+        ordered queries sorts rows (i.e. an index yields them in order); return their plans."""
+        queries = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(queries)
+        plans = []
+        for sql in queries:
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN {sql}')
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            for table in LARGE_TABLES:
+                self.assertIsNone(re.search(rf'Seq Scan on {table}\b', plan), f"{sql}\n{plan}")
+            if ' ORDER BY ' in sql:
+                self.assertIsNone(re.search(r'\bSort\b', plan), f"{sql}\n{plan}")
+            plans.append(plan)
+        return plans
+
+    def assertUsesIndex(self, plans, index):
+        """Assert that the index (a regular expression of index names) serves at least one of the plans."""
+        pattern = rf'(Scan using|Index Scan on) ({index})\b'
+        self.assertTrue(any(re.search(pattern, plan) for plan in plans), '\n\n'.join(plans))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Drill-down indexes are specific to PostgreSQL')
+class SearchResultEntriesPagingTests(SeededTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+
+        # Documents of the source, many of which share a title; and a few of another source
+        ScopusDocument.objects.bulk_create([
+            ScopusDocument(scopus_id=87000000000 + i, title=f'Title {i % 3}', scopus_source=cls.source)
+            for i in range(PAGING_DOCUMENTS)
+        ] + [
+            ScopusDocument(scopus_id=87100000000 + i, title=f'Title {i % 3}', scopus_source=cls.sources[1])
+            for i in range(3)
+        ])
+
+        # A finished search that found every document
+        category = cls.classification.category_abbr
+        cls.search = Search.objects.create(query='paging', context={
+            'categories': [category], 'finished_categories': [category],
+        })
+        SearchResult_Entry.objects.bulk_create([
+            make_entry(cls.search, category, document) for document in ScopusDocument.objects.all()
+        ])
+        cls.documents = [str(scopus_id) for scopus_id in ScopusDocument.objects.filter(
+            scopus_source=cls.source,
+        ).order_by('title', 'scopus_id').values_list('scopus_id', flat=True)]
+
+    #
+    # -- Tests
+    #
+
+    def test_next_pages(self):
+        pages = self.get_pages()
+        self.assertEqual([len(page['results']) for page in pages], [4, 4, 4, 4, 4, 3])
+        self.assertEqual([entry['scopus_id'] for page in pages for entry in page['results']], self.documents)
+        self.assertEqual({page['count'] for page in pages}, {PAGING_DOCUMENTS})
+        self.assertIsNone(pages[0]['previous'])
+        self.assertIsNone(pages[-1]['next'])
+
+    def test_previous_pages(self):
+        pages = self.get_pages()
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self.get_page(page['previous'])
+            self.assertEqual(page['results'], expected['results'])
+            self.assertEqual(page['count'], PAGING_DOCUMENTS)
+        self.assertIsNone(page['previous'])
+
+    def test_count_carried_in_cursor(self):
+        # Documents are counted for the first page only
+        with CaptureQueriesContext(connection) as first:
+            page = self.get_page()
+        with CaptureQueriesContext(connection) as following:
+            page = self.get_page(page['next'])
+        self.assertTrue(any('COUNT(' in query['sql'] for query in first.captured_queries))
+        self.assertFalse(any('COUNT(' in query['sql'] for query in following.captured_queries))
+        self.assertEqual(page['count'], PAGING_DOCUMENTS)
+
+    #
+    # -- Helpers
+    #
+
+    def get_page(self, cursor=None):
+        """GET page of the entries of the source, at cursor (if any); return its content."""
+        params = {
+            'category': self.classification.category_abbr, 'classification': self.classification.code,
+            'source': self.source.source_id, 'limit': PAGING_LIMIT,
+        }
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get(reverse('visualizer:search_result_entries', args=[self.search.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get_pages(self):
+        """Return the content of every page of the entries of the source, following next cursors."""
+        pages = [self.get_page()]
+        while pages[-1]['next']:
+            pages.append(self.get_page(pages[-1]['next']))
+        return pages
+
+@skipUnless(connection.vendor == 'postgresql', 'Entries are ingested with PostgreSQL upserts')
+class SearchResultIngestionTests(SeededTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.category = cls.classification.category_abbr
+
+        # A document that an earlier search found while its source was unknown
+        cls.stored = ScopusDocument.objects.create(
+            scopus_id=88000000000, title='Stored title', publication_name='Stored publication', scopus_source=None,
+        )
+        cls.earlier_search = Search.objects.create(query='earlier', context={
+            'categories': [cls.category], 'finished_categories': [cls.category],
+        })
+        make_entry(cls.earlier_search, cls.category, cls.stored).save()
+
+    def setUp(self):
+        self.search = Search.init_search('ingest', [self.category], Search.MODE_CATEGORY)
+
+    #
+    # -- Tests
+    #
+
+    def test_page(self):
+        records = [self.record(88000000001), self.record(88000000002, known=False), self.record(88000000001)]
+        created = _create_search_result_entries(self.search, 'url', records, lambda row: (self.category,))
+
+        # Documents that appear more than once in the page are recorded once
+        self.assertEqual([row['scopus_id'] for row in created[self.category]], [88000000001, 88000000002])
+        self.assertEqual(dict(self.search.entries.values_list('document_id', 'scopus_source_id')), {
+            88000000001: self.source.id, 88000000002: None,
+        })
+        self.assertEqual(ScopusDocument.objects.get(scopus_id=88000000001).title, 'Title 88000000001')
+
+    def test_stored_document(self):
+        # The stored document is found again, now that its source is known
+        records = [self.record(self.stored.scopus_id)]
+        created = _create_search_result_entries(self.search, 'url', records, lambda row: (self.category,))
+        self.assertEqual(created[self.category][0]['scopus_source_id'], self.source.id)
+
+        # This search records the source it resolved; neither the stored document nor the entry of the
+        # earlier search change
+        self.assertEqual(self.search.entries.get().scopus_source_id, self.source.id)
+        self.assertEqual(
+            ScopusDocument.objects.filter(scopus_id=self.stored.scopus_id).values_list('title', 'scopus_source_id').get(),
+            ('Stored title', None),
+        )
+        self.assertIsNone(self.earlier_search.entries.get().scopus_source_id)
+
+    def test_recorded_entry(self):
+        # Entries already recorded (e.g. before the search was interrupted) are neither created nor reported again
+        records = [self.record(88000000001)]
+        _create_search_result_entries(self.search, 'url', records, lambda row: (self.category,))
+        records.append(self.record(88000000002))
+        created = _create_search_result_entries(self.search, 'url', records, lambda row: (self.category,))
+        self.assertEqual([row['scopus_id'] for row in created[self.category]], [88000000002])
+        self.assertEqual(self.search.entries.count(), 2)
+        self.assertEqual(_create_search_result_entries(self.search, 'url', records, lambda row: (self.category,)), {})
+
+    #
+    # -- Helpers
+    #
+
+    def record(self, scopus_id, known=True):
+        """Return cleaned Scopus search result entry (see `_clean_search_result_entry()`), published by
+        the seeded source or, unless known, by a source that isn't in the catalog."""
+        return {
+            'scopus_id': scopus_id,
+            'doi': None,
+            'title': f'Title {scopus_id}',
+            'first_author': None,
+            'document_type': None,
+            'publication_name': f'Publication {scopus_id}',
+            'source_id': self.source.source_id if known else 99999,
+        }
+
+@skipUnless(connection.vendor == 'postgresql', 'Entries are ingested with PostgreSQL upserts')
+@override_settings(SCOPUS_CHECKPOINT_PAGES=2, SCOPUS_CHECKPOINT_SECS=3600, ABSTRACT_PREFETCH_SOURCES=0)
+class SearchCheckpointTests(SeededTestCase):
+
+    def setUp(self):
+        self.category = self.classification.category_abbr
+        self.search = Search.init_search('resume', [self.category], Search.MODE_CATEGORY)
+
+        # Serve search results from a fake crawl of Scopus; remember which pages were requested
+        self.fetched = []
+        self.fail_at = None
+        patcher = mock.patch('visualizer.scopus._fetch_search_results_page', side_effect=self.fetch_page)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(_shutdown.clear)
+
+    #
+    # -- Tests
+    #
+
+    def test_resume_after_shutdown(self):
+        # The worker is asked to shut down once the second page is written, so the search stops once
+        # the third page is written, after checkpointing it
+        with self.interrupt_after(2, _shutdown.set):
+            with self.assertRaises(SearchInterrupted):
+                _search_category(self.search, self.category)
+        checkpoint = SearchCheckpoint.objects.get(search=self.search, category_abbr=self.category)
+        self.assertEqual((checkpoint.cursor, checkpoint.pages), (self.cursor(3), 3))
+        self.assertEqual(self.search.entries.count(), 3*CRAWL_PAGE_SIZE)
+        self.assertCounted(3*CRAWL_PAGE_SIZE)
+
+        # Resumed search picks up at the checkpointed cursor
+        _shutdown.clear()
+        self.resume()
+        self.assertEqual(self.fetched[0], self.cursor(3))
+        self.assertRecorded()
+
+    def test_resume_after_quota_exceeded(self):
+        # The quota runs out while the fourth page is fetched, so the search stops after checkpointing
+        # the third page
+        self.fail_at = 3
+        with mock.patch('visualizer.scopus.publish_progress'):
+            with self.assertRaises(QuotaExceeded):
+                _search_category(self.search, self.category)
+        checkpoint = SearchCheckpoint.objects.get(search=self.search, category_abbr=self.category)
+        self.assertEqual((checkpoint.cursor, checkpoint.pages), (self.cursor(3), 3))
+        self.assertCounted(3*CRAWL_PAGE_SIZE)
+
+        # Resumed search picks up at the page that couldn't be fetched
+        self.resume()
+        self.assertEqual(self.fetched[0], self.cursor(3))
+        self.assertRecorded()
+
+    def test_resume_after_crash(self):
+        # The worker is killed once the third page is written, before its progress is checkpointed
+        with self.interrupt_after(3, mock.Mock(side_effect=WorkerKilled())):
+            with self.assertRaises(WorkerKilled):
+                _search_category(self.search, self.category)
+        checkpoint = SearchCheckpoint.objects.get(search=self.search, category_abbr=self.category)
+        self.assertEqual((checkpoint.cursor, checkpoint.pages), (self.cursor(2), 2))
+        self.assertEqual(self.search.entries.count(), 3*CRAWL_PAGE_SIZE)
+
+        # Resumed search re-reads the third page, whose entries are neither recorded nor counted twice
+        self.resume()
+        self.assertEqual(self.fetched[0], self.cursor(2))
+        self.assertRecorded()
+
+    #
+    # -- Helpers
+    #
+
+    def cursor(self, page):
+        """Return cursor of fake page of search results (numbered from 0)."""
+        return f'cursor-{page}' if page else ELSEVIER_FIRST_CURSOR
+
+    def fetch_page(self, search, crawl, query_url, page_cursor):
+        """Return fake page of search results, like `_fetch_search_results_page()`; every fifth
+        document is published by a source that isn't in the catalog. Raise QuotaExceeded, once, for
+        the page numbered fail_at (if any)."""
+        self.fetched.append(page_cursor)
+        page = 0 if page_cursor == ELSEVIER_FIRST_CURSOR else int(page_cursor.split('-')[1])
+        if page == self.fail_at:
+            self.fail_at = None
+            raise QuotaExceeded('search', None)
+        total = CRAWL_PAGES*CRAWL_PAGE_SIZE
+        if page >= CRAWL_PAGES:
+            return (query_url, '1000', total, None, None)
+        records = []
+        for i in range(page*CRAWL_PAGE_SIZE, (page + 1)*CRAWL_PAGE_SIZE):
+            records.append({
+                'scopus_id': 86000000000 + i,
+                'doi': None,
+                'title': f'Resumed {i}',
+                'first_author': None,
+                'document_type': None,
+                'publication_name': f'Publication {i % 3}',
+                'source_id': 99999 if i % 5 == 0 else self.sources[i % len(self.sources)].source_id,
+            })
+        return (query_url, '1000', total, self.cursor(page + 1), records)
+
+    def interrupt_after(self, pages, interrupt):
+        """Return patch of progress publication that calls interrupt once the given number of pages
+        have been written."""
+        def publish(search_id, event, **data):
+            if event == EVENT_PAGE and data['page'] == pages:
+                interrupt()
+        return mock.patch('visualizer.scopus.publish_progress', side_effect=publish)
+
+    def resume(self):
+        """Search category again, as the rescheduled search would, once the interrupted search has
+        stopped prefetching pages."""
+        for thread in threading.enumerate():
+            if thread.name.startswith(f'prefetch-{self.search.id}-'):
+                thread.join()
+        self.fetched = []
+        with mock.patch('visualizer.scopus.publish_progress'):
+            _search_category(self.search, self.category)
+
+    def assertCounted(self, total):
+        """Assert that the counts of the category match its entries, and their total."""
+        counts = SearchResult_Category.objects.get(search=self.search, category_abbr=self.category).counts
+        self.assertEqual(counts, get_category_counts(self.search, self.category))
+        self.assertEqual(counts['total']['count'], total)
+
+    def assertRecorded(self):
+        """Assert that every document of the crawl was recorded and counted exactly once."""
+        self.search.refresh_from_db()
+        self.assertIn(self.category, self.search.context['finished_categories'])
+        self.assertEqual(
+            sorted(self.search.entries.values_list('document_id', flat=True)),
+            [86000000000 + i for i in range(CRAWL_PAGES*CRAWL_PAGE_SIZE)],
+        )
+        self.assertCounted(CRAWL_PAGES*CRAWL_PAGE_SIZE)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Search results are stored in PostgreSQL JSON fields')
+class SearchResponseCacheTests(TestCase):
+
+    def setUp(self):
+        # Cache responses in a fake Redis of this test's own
+        self.redis = fakeredis.FakeStrictRedis()
+        for patcher in [
+            mock.patch('visualizer.response_cache.get_redis_conn', return_value=self.redis),
+            mock.patch('visualizer.catalog.get_catalog_version', return_value=0),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.search = Search.objects.create(query='cached', finished=True, context={
+            'categories': ['CHEM'], 'finished_categories': ['CHEM'],
+        })
+        SearchResult_Category.objects.create(search=self.search, category_abbr='CHEM', counts={
+            'total': {'name': 'Total', 'count': 1},
+        })
+        self.url = reverse('search_results', args=[self.search.id])
+
+    #
+    # -- Tests
+    #
+
+    def test_finished_search(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertCached(1)
+
+        # Cached response is served without touching the database, until it no longer matches
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual((cached.status_code, cached.content), (200, response.content))
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_unfinished_search(self):
+        Search.objects.filter(id=self.search.id).update(finished=False)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertCached(0)
+
+    def test_deleted_search(self):
+        Search.objects.filter(id=self.search.id).update(deleted=True)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertCached(0)
+
+    def test_not_found(self):
+        url = reverse('search_result_sources', args=[self.search.id])
+        response = self.client.get(url, {'category': 'CHEM', 'classification': '9999'})
+        self.assertEqual(response.status_code, 404)
+        self.assertCached(0)
+
+    def test_delete_search(self):
+        self.client.get(self.url)
+        self.assertCached(1)
+
+        # Deleting the search forgets its cached responses, so that they are no longer served
+        response = self.client.delete(self.url)
+        self.assertEqual(response.json(), {'deleted': True})
+        self.assertCached(0)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    #
+    # -- Helpers
+    #
+
+    def assertCached(self, count):
+        """Assert the number of responses of the search that are cached."""
+        self.assertEqual(self.redis.hlen(_response_cache_key(self.search.id)), count)
@@ -2,29 +2,110 @@
 Views to support Visualizer URLs
 """
 # Standard
+import base64
+from datetime import datetime
+from functools import wraps
+from hashlib import sha1
 import json
+from time import monotonic
 
 # 3rd party
-from django.db.models import Count, F
-from django.http import JsonResponse, Http404, HttpResponseNotAllowed
+from django import db
+from django.conf import settings
+from django.core.exceptions import SuspiciousOperation
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, Http404, HttpResponseNotAllowed, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag, urlencode
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.views.decorators.http import require_http_methods, require_GET, require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_http_methods, require_GET, require_POST
 
 # Internal
-from project.worker import queue_job, get_pending_jobs
+from project.worker import dequeue_job, fetch_job, queue_job, get_pending_jobs
+from visualizer.catalog import (
+    get_categories,
+    get_classification,
+    get_classification_catalog_etag,
+    get_classifications,
+)
 from visualizer.models import (
     ScopusClassification,
     ScopusSource,
     Search,
+    SearchResult_Category,
     SearchResult_Entry,
+    SearchResult_Source,
     CATEGORIES,
     FINISHED_CATEGORIES,
 )
-from visualizer.scopus import get_abstract, get_search_results, get_subject_area_classifications
+from visualizer.progress import subscribe_progress
+from visualizer.quota import QuotaExceeded
+from visualizer.response_cache import cache_response, get_cached_response, invalidate_search_responses
+from visualizer.scopus import (
+    build_source_rollups,
+    get_cached_abstract,
+    get_search_results,
+    SEARCH_JOB_TIMEOUT,
+    STALE_RESULTS_HRS,
+)
 
 # Constants
 MAX_LIMIT = 100
+SEARCHES_LIMIT = 50 # default page size of the finished search listing
+SOURCES_LIMIT = 500 # the most sources charted for a classification
+PROGRESS_RETRY_MS = 1000 # how long progress stream clients wait before they reconnect
+
+#
+# -- Decorators
+#
+
+
+def cache_finished_search(view):
+    """Decorate a view of the results of a search (identified by its `search_id` argument), so that the
+    GET responses of finished searches are cached in Redis (see `visualizer.response_cache`) and carry
+    ETag, Last-Modified and Cache-Control headers. Conditional requests that match are answered with
+    304 NOT MODIFIED; either way, cached responses are served without touching the database.
+
+    Responses of unfinished (or deleted) searches, and responses other than 200 OK, are never cached.
+    """
+    @wraps(view)
+    def wrapper(request, search_id=None, **kwargs):
+        if request.method != 'GET' or search_id is None:
+            return view(request, search_id=search_id, **kwargs)
+
+        # Responses are cached per view and query string, whatever the order of query params
+        field = f'{view.__name__}?{urlencode(sorted(request.GET.lists()), doseq=True)}'
+        entry = get_cached_response(search_id, field)
+        if entry is None:
+            # Don't cache responses of searches that might yet change; check before the response is
+            # computed, so that a search that finishes meanwhile can't have its partial results cached
+            modified = Search.objects.filter(
+                id=search_id, finished=True, deleted=False,
+            ).values_list('modified', flat=True).first()
+            response = view(request, search_id=search_id, **kwargs)
+            if modified is None or response.status_code != 200:
+                return response
+            entry = {
+                'etag': quote_etag(sha1(response.content).hexdigest()),
+                'last_modified': int(modified.timestamp()),
+                'content': response.content.decode(),
+            }
+            cache_response(search_id, field, entry)
+
+        response = HttpResponse(entry['content'], content_type='application/json')
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        patch_cache_control(response, private=True, max_age=settings.SEARCH_RESPONSE_MAX_AGE)
+        return get_conditional_response(
+            request, etag=entry['etag'], last_modified=entry['last_modified'], response=response,
+        )
+
+    return wrapper
+
 
 #
 # -- Public functions
@@ -39,7 +120,12 @@ def abstract(request, scopus_id):
     request -- an HttpRequest object
     scopus_id -- a Scopus ID
     """
-    abstract = get_abstract(scopus_id)
+    try:
+        abstract = get_cached_abstract(scopus_id)
+    except QuotaExceeded as exc:
+        response = JsonResponse({'error': str(exc)}, status=429)
+        response['Retry-After'] = max(int((exc.reset_at - datetime.now()).total_seconds()), 0)
+        return response
     return JsonResponse({'abstract': abstract}, status=200)
 
 
@@ -53,12 +139,17 @@ def search(request):
         categories -- (optional) a list of scopus category abbreviations (e.g. ['AGRI','CHEM']);
             when specified, search will be limited to those categories; when unspecified, search
             will be performed across all categories.
+        mode -- (optional) a search mode, 'category' or 'single_pass' (see `Search.MODES`); when
+            unspecified, the configured default mode will be used.
     """
     # Unpack request body
     body = json.loads(request.body)
+    mode = body.get('mode')
+    if mode and mode not in Search.MODES:
+        return JsonResponse({'error': f"Unsupported search mode, {mode}"}, status=400)
 
     # Launch asynchronous search
-    job, search = _search(body['query'], body.get('categories'))
+    job, search = _search(body['query'], body.get('categories'), mode)
 
     # Respond with job ID and search ID
     return JsonResponse({'search': _serialize_search_job(job, search)}, status=200)
@@ -75,6 +166,7 @@ def search_restart(request, search_id):
 
 
 @require_http_methods(['GET', 'DELETE'])
+@cache_finished_search
 def search_results(request, search_id=None):
     """TODO: comments"""
     response = {}
@@ -87,11 +179,12 @@ def search_results(request, search_id=None):
             response = {
                 'deleted': True,
             }
-        # Handle GET request
+        # Handle GET request; counts of unfinished searches are reported as they stand. Counts are
+        # read straight from the search results records, never through the (worker) search code.
         else:
-            search = _get_search(search_id)
+            search = _get_search(search_id, finished=None)
             response = {
-                'results': get_search_results(search.query, search_id=search.id)
+                'results': SearchResult_Category.get_counts(search)
             }
 
     # If request is for all search results:
@@ -99,26 +192,51 @@ def search_results(request, search_id=None):
         # Unpack query params
         pending = request.GET.get('pending') in ['true', 'True', True]
 
+        # The set of all categories is the same for every search serialized by this request
+        all_categories = set(ScopusClassification.all_categories())
+
         # If pending results have been requested, return a list of search results that are pending
         if pending:
             # Get pending jobs and serialize those pending searches
             pending_jobs = get_pending_jobs()
-            pending_searches = _serialize_search_jobs(pending_jobs)
+            pending_searches = _serialize_search_jobs(pending_jobs, all_categories)
             pending_search_ids = [s['id'] for s in pending_searches]
 
             # In case of a worker malfunction, get unfinished searches that aren't associated with pending jobs
             stalled_searches = Search.objects.filter(finished=False, deleted=False).exclude(id__in=pending_search_ids)
-            stalled_searches = [_serialize_search(search) for search in stalled_searches]
+            stalled_searches = [_serialize_search(search, all_categories) for search in _with_finished_at(stalled_searches)]
 
             response = {
                 'results': sorted(pending_searches + stalled_searches, key=lambda s: s['created_at'], reverse=True)
             }
 
-        # Otherwise, return a list of search results that are ready (search is finished)
+        # Otherwise, return a page of search results that are ready (search is finished), ordered by
+        # query and then newest first; optionally filtered by query text (`q`) and by category
+        # (`category`); the next page is requested by passing the `next` cursor of this page (`cursor`)
         else:
-            searches = Search.objects.filter(finished=True, deleted=False).order_by('query', '-created')
+            limit = _get_limit(request, SEARCHES_LIMIT)
+            searches = Search.objects.filter(finished=True, deleted=False)
+            if request.GET.get('q'):
+                searches = searches.filter(query__icontains=request.GET['q'])
+            if request.GET.get('category'):
+                searches = searches.filter(context__categories__contains=[request.GET['category']])
+            if request.GET.get('cursor'):
+                try:
+                    query, search_id = _decode_cursor(request.GET['cursor'])
+                except (TypeError, ValueError):
+                    raise SuspiciousOperation(f"Invalid cursor, {request.GET['cursor']}")
+                searches = searches.filter(Q(query__gt=query) | Q(query=query, id__lt=search_id))
+
+            # Fetch one more search than requested to learn whether there is a next page
+            searches = list(_with_finished_at(searches).order_by('query', '-id')[:limit+1])
+            next_cursor = None
+            if len(searches) > limit:
+                searches = searches[:limit]
+                next_cursor = _encode_cursor([searches[-1].query, searches[-1].id])
+
             response = {
-                'results': [_serialize_search(search) for search in searches]
+                'results': [_serialize_search(search, all_categories) for search in searches],
+                'next': next_cursor,
             }
     else:
         raise HttpResponseNotAllowed(f"Method not allowed for listing endpoint")
@@ -127,87 +245,186 @@ def search_results(request, search_id=None):
 
 
 @require_GET
+def search_progress(request):
+    """Stream progress of searches as Server-Sent Events.
+
+    The stream opens with a `search` event per search, which carries its current serialization
+    (see `_serialize_search_job()`), followed by progress events as they are published by workers
+    (see `visualizer.progress`): `page`, `category` and `status`. Each event's data is a JSON object.
+
+    The stream is a long poll: it ends as soon as progress events have been relayed, or after
+    settings.SEARCH_PROGRESS_POLL_SECS if there are none, so that it ties up a web thread (and no
+    database connection) for a few seconds at most. EventSource clients reconnect on their own, after
+    PROGRESS_RETRY_MS, and are sent fresh `search` events, so nothing that happened in between is lost.
+
+    Arguments:
+    request -- an HttpRequest object with query params:
+        search -- a Search object ID; may be repeated, up to MAX_LIMIT times
+    """
+    try:
+        search_ids = [int(search_id) for search_id in request.GET.getlist('search')][:MAX_LIMIT]
+    except ValueError:
+        raise Http404(f"Search not found, {request.GET.getlist('search')}")
+
+    response = StreamingHttpResponse(_stream_search_progress(search_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # don't let proxies buffer the stream
+    return response
+
+
+@require_GET
+@cache_finished_search
 def search_result_sources(request, search_id):
-    """TODO: comments"""
+    """Get the sources that published the most documents that a search found within a category and
+    classification, largest first; the remaining sources are summed up as a single "other" bucket.
+
+    Sources are read, in order, from the rollups counted when the category finished (see
+    `visualizer.scopus.build_source_rollups()`). Searches that finished before rollups existed have
+    theirs counted on first request.
+
+    Arguments:
+    request -- an HttpRequest object with query params:
+        category -- a scopus category abbreviation (e.g. 'CHEM')
+        classification -- a scopus classification code (e.g. '1602'), or 'unknown'
+        limit -- (optional) an integer; the most sources to return, up to SOURCES_LIMIT
+    search_id -- a Search object ID
+    """
     # Unpack query params
     category_abbr = request.GET.get('category')
     classification_code = request.GET.get('classification')
+    limit = _get_limit(request, SOURCES_LIMIT, SOURCES_LIMIT)
 
     # Validate request
     search = _get_search(search_id)
     classification = _get_classification(category_abbr, classification_code)
-
-    # TODO: comment
     if classification:
-        sources = ScopusSource.objects.filter(
-            classifications=classification,
-            entries__search=search,
-            entries__category_abbr=classification.category_abbr,
-        ).distinct().annotate(count=Count('entries')).values('source_id','source_name','count')
-    else:
-        sources = SearchResult_Entry.objects.filter(
-            search_id=search, category_abbr=category_abbr, scopus_source__isnull=True
-        ).values('publication_name').annotate(count=Count('id'),source_name=F('publication_name')).values('source_name','count')
+        category_abbr = classification['category_abbr']
+        classification_code = classification['code']
+
+    # Count sources of category, if they weren't counted when it finished; lock the search while doing
+    # so, so that concurrent first requests don't both count them
+    rollups = SearchResult_Source.objects.filter(search=search, category_abbr=category_abbr)
+    if not rollups.exists():
+        with transaction.atomic():
+            Search.objects.select_for_update().filter(id=search.id).first()
+            if not rollups.exists():
+                build_source_rollups(search, category_abbr)
+
+    # Get largest sources, then sum up the rest
+    rollups = rollups.filter(classification_code=classification_code)
+    sources = list(rollups.order_by('-count', 'id').values('source_id', 'source_name', 'count')[:limit])
+    other = None
+    if len(sources) == limit:
+        totals = rollups.aggregate(sources=Count('id'), count=Sum('count'))
+        if totals['sources'] > limit:
+            other = {
+                'sources': totals['sources'] - limit,
+                'count': totals['count'] - sum(source['count'] for source in sources),
+            }
 
-    # TODO: comment
     response = {
         'results': [{
-            'id': source.get('source_id'), # TODO: This is confusing; source_id comes from Scopus; it's not our primary key
+            'id': source['source_id'], # Scopus source ID (not our primary key); None for unknown sources
             'name': source['source_name'],
             'count': source['count'],
-        } for source in sources]
+        } for source in sources],
+        'other': other,
     }
 
     return JsonResponse(response, status=200)
 
 
 @require_GET
+@cache_finished_search
 def search_result_entries(request, search_id):
-    """TODO: comments"""
+    """Get a page of the documents that a search found within a category (and classification) and that
+    were published by a source.
+
+    Documents are ordered by title (then Scopus ID) and paged by keyset: the `next` and `previous`
+    cursors of a page identify the pages on either side of it, so every page costs the same to fetch,
+    however deep. The total count of documents is computed for the first page and carried along in
+    the cursors, rather than counted again for every page.
+
+    Arguments:
+    request -- an HttpRequest object with query params:
+        category -- a scopus category abbreviation (e.g. 'CHEM')
+        classification -- a scopus classification code (e.g. '1602'), or 'unknown'
+        source -- a Scopus source ID, or the publication name of an unknown (or unclassified) source
+        limit -- (optional) an integer; page size, up to MAX_LIMIT
+        cursor -- (optional) the `next` or `previous` cursor of another page; first page if unspecified
+    search_id -- a Search object ID
+    """
     # Unpack query params
     category_abbr = request.GET.get('category')
     classification_code = request.GET.get('classification')
     source_id = request.GET.get('source')
-    limit = int(request.GET.get('limit', MAX_LIMIT))
-    offset = int(request.GET.get('offset', 0))
-    assert limit <= MAX_LIMIT # TODO: be more graceful
+    limit = _get_limit(request)
+    cursor = request.GET.get('cursor')
 
     # Validate request
     search = _get_search(search_id)
     classification = _get_classification(category_abbr, classification_code)
 
-    # TODO: comment
+    # Get entries of the documents that the search found within the category and that were published by
+    # the source, as resolved when the search found them (see `SearchResult_Entry.scopus_source`)
     if classification:
         source = _get_source(source_id)
+        category_abbr = classification['category_abbr']
         entries = SearchResult_Entry.objects.filter(
             search=search,
-            category_abbr=classification.category_abbr,
+            category_abbr=category_abbr,
             scopus_source=source,
         )
     else:
         entries = SearchResult_Entry.objects.filter(
+            SearchResult_Entry.UNCLASSIFIED,
             search=search,
             category_abbr=category_abbr,
             publication_name=source_id,
         )
+    entries = entries.select_related('document')
+
+    # Get page of entries on the requested side of the cursor (if any), fetching one more entry than
+    # requested to learn whether there is another page beyond it. The redundant bound on title lets the
+    # index scan start at the cursor, rather than skip every entry before it.
+    if cursor:
+        try:
+            direction, title, scopus_id, count = _decode_cursor(cursor)
+        except (TypeError, ValueError):
+            raise SuspiciousOperation(f"Invalid cursor, {cursor}")
+        if direction == 'previous':
+            entries_page = entries.filter(title__lte=title).filter(Q(title__lt=title) | Q(title=title, document_id__lt=scopus_id))
+            entries_page = list(entries_page.order_by('-title', '-document_id')[:limit+1])
+            more = len(entries_page) > limit
+            entries_page = entries_page[:limit][::-1]
+            has_previous, has_next = more, True
+        else:
+            entries_page = entries.filter(title__gte=title).filter(Q(title__gt=title) | Q(title=title, document_id__gt=scopus_id))
+            entries_page = list(entries_page.order_by('title', 'document_id')[:limit+1])
+            more = len(entries_page) > limit
+            entries_page = entries_page[:limit]
+            has_previous, has_next = True, more
+    else:
+        count = entries.count()
+        entries_page = list(entries.order_by('title', 'document_id')[:limit+1])
+        has_previous, has_next = False, len(entries_page) > limit
+        entries_page = entries_page[:limit]
 
-    # TODO: comment
-    entries_page = entries.order_by('title')[offset:offset+limit]
-
-    # TODO: comment
+    # Assemble cursors of the pages on either side of this one
+    first, last = (entries_page[0], entries_page[-1]) if entries_page else (None, None)
     response = {
-        'count': entries.count(),
-        # 'next': ,
-        # 'previous': ,
+        'count': count,
+        'next': _encode_cursor(['next', last.title, last.document_id, count]) if has_next and last else None,
+        'previous': _encode_cursor(['previous', first.title, first.document_id, count]) if has_previous and first else None,
         'results': [{
-            'category_abbr': entry.category_abbr,
-            'scopus_id': entry.scopus_id,
-            'doi': entry.doi,
+            'category_abbr': category_abbr,
+            'scopus_id': str(entry.document_id),
+            'doi': entry.document.doi,
             'title': entry.title,
-            'first_author': entry.first_author,
-            'document_type': entry.document_type,
+            'first_author': entry.document.first_author,
+            'document_type': entry.document.document_type,
             'publication_name': entry.publication_name,
-            'scopus_source_id': entry.scopus_source and entry.scopus_source.id,
+            'scopus_source_id': entry.scopus_source_id,
         } for entry in entries_page]
     }
 
@@ -215,26 +432,16 @@ def search_result_entries(request, search_id):
 
 
 @require_GET
+@etag(lambda request: get_classification_catalog_etag())
+@cache_control(no_cache=True)
 def subject_area_classifications(request):
-    """Get Scopus subject area classifications (and parent categories)."""
-    # Unpack query params
-    cached = request.GET.get('cached') in ['true', 'True', True]
-
-    if cached:
-        # Get categories and classifications stores in local database
-        categories = {
-            c.category_abbr: {'abbr': c.category_abbr, 'name': c.category_name}
-            for c in ScopusClassification.objects.distinct('category_abbr').order_by('category_abbr')
-        }
-        classifications = {
-            c.code: {'code': c.code, 'name': c.name, 'category_abbr': c.category_abbr, 'category_name': c.category_name}
-            for c in ScopusClassification.objects.distinct('code').order_by('code')
-        }
-    else:
-        # Get categories and classifications straight from Scopus in realtime
-        categories, classifications = get_subject_area_classifications()
+    """Get Scopus subject area classifications (and parent categories) from the in-process catalog (see
+    `visualizer.catalog`).
 
-    return JsonResponse({'categories': categories, 'classifications': classifications}, status=200)
+    Responses carry a strong ETag that changes only with the catalog version, and browsers must
+    revalidate them, so the catalog is only downloaded again after `populate_database` has changed it.
+    """
+    return JsonResponse({'categories': get_categories(), 'classifications': get_classifications()}, status=200)
 
 
 @ensure_csrf_cookie
@@ -248,17 +455,25 @@ def visualizer(request):
 #
 
 
-def _search(query, categories=None):
+def _search(query, categories=None, mode=None):
     """Private handler for public `search()` view. See that function for more details. This is for
     testing convenience, so that async jobs can be queued without an HTTP request being involved.
     """
+    # If the same search is already in progress or finished recently, reuse it rather than crawling
+    # Scopus again; results only go stale after STALE_RESULTS_HRS
+    search = Search.get_fresh_search(query, categories, mode, max_age_hrs=STALE_RESULTS_HRS)
+    if search:
+        print(f"_search(): INFO: {query}, reuse search {search.id}")
+        return (fetch_job(search.job_id), search)
+
     # Initialize search object and queue job for async worker
-    search = Search.init_search(query, categories)
-    job = queue_job(get_search_results, args=(query, categories, search.id), job_timeout=12*60*60)
+    search = Search.init_search(query, categories, mode)
+    job = queue_job(get_search_results, args=(query, categories, search.id), job_timeout=SEARCH_JOB_TIMEOUT)
 
-    # Record job ID on search object
+    # Record job ID on search object; update the row rather than save the object, since the worker may
+    # already be updating the search's context
+    Search.objects.filter(id=search.id).update(job_id=job.id)
     search.job_id = job.id
-    search.save()
 
     # Return job and search objects
     return (job, search)
@@ -267,32 +482,80 @@ def _search_restart(search_id):
     """Private handler for public `search_restart()` view. See that function for more details. This is for
     testing convenience, so that async jobs can be queued without an HTTP request being involved.
     """
-    # Get existing search object and queue job for async worker
+    # Get existing search object; cancel any job that is scheduled to resume it; queue job for async worker
     search = _get_search(search_id, finished=False)
-    job = queue_job(get_search_results, args=(search.query, None, search.id), job_timeout=12*60*60)
+    dequeue_job(search.job_id)
+    job = queue_job(get_search_results, args=(search.query, None, search.id), job_timeout=SEARCH_JOB_TIMEOUT)
 
-    # Record job ID on search object
+    # Record job ID on search object (see `_search()`); forget any responses cached before the restart
+    Search.objects.filter(id=search.id).update(job_id=job.id)
     search.job_id = job.id
-    search.save()
+    invalidate_search_responses(search.id)
 
     return (job, search)
 
+def _stream_search_progress(search_ids):
+    """Generate Server-Sent Events for `search_progress()`."""
+    pubsub = subscribe_progress(search_ids) if search_ids else None
+    try:
+        # Have clients reconnect once the stream ends
+        yield f'retry: {PROGRESS_RETRY_MS}\n\n'
+
+        # Send current state of searches; having already subscribed, no event can fall in between
+        all_categories = set(ScopusClassification.all_categories())
+        for search in _with_finished_at(Search.objects.filter(id__in=search_ids, deleted=False)):
+            yield _format_event('search', _serialize_search_job(fetch_job(search.job_id), search, all_categories))
+        if not pubsub:
+            return
+
+        # Don't hold on to a database connection while waiting for events
+        db.connection.close()
+
+        # Wait for progress events; relay the first, along with any that arrived with it, then end the
+        # stream. Subscription confirmations come first, and are read as None, so keep waiting past them.
+        deadline = monotonic() + settings.SEARCH_PROGRESS_POLL_SECS
+        while monotonic() < deadline:
+            message = pubsub.get_message(timeout=max(deadline - monotonic(), 0))
+            if message and message['type'] == 'message':
+                while message:
+                    data = json.loads(message['data'])
+                    yield _format_event(data['event'], data)
+                    message = pubsub.get_message()
+                return
+    finally:
+        if pubsub:
+            pubsub.close()
+
+def _format_event(event, data):
+    """Return Server-Sent Event of type event, with data serialized as JSON."""
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
 def _get_search(search_id, finished=True):
-    """TODO: comment"""
+    """Return search that has not been deleted; raise 404 if not found.
+
+    Arguments:
+    search_id -- a Search object ID
+    finished -- (optional) a boolean, the required status of the search; None if the search may be
+        finished or unfinished
+    """
     try:
-        return Search.objects.filter(finished=finished, deleted=False).get(id=search_id)
+        searches = Search.objects.filter(deleted=False)
+        if finished is not None:
+            searches = searches.filter(finished=finished)
+        return searches.get(id=search_id)
     except:
         raise Http404(f"Search not found, {search_id}")
 
 def _get_classification(category_abbr, classification_code):
-    """TODO: comment"""
-    try:
-        if classification_code == ScopusClassification.UNKNOWN:
-            assert category_abbr, f"Category must be specified when classification is {ScopusClassification.UNKNOWN}"
-            return None
-        return ScopusClassification.objects.get(code=classification_code)
-    except:
+    """Return classification from the catalog (see `visualizer.catalog.get_classification()`), or None if
+    the classification is 'unknown', in which case the category must be specified; raise 404 if not found.
+    """
+    if classification_code == ScopusClassification.UNKNOWN and category_abbr:
+        return None
+    classification = get_classification(classification_code)
+    if classification is None:
         raise Http404(f"Classification not found, {classification_code}")
+    return classification
 
 def _get_source(source_id):
     """TODO: comment"""
@@ -301,16 +564,54 @@ def _get_source(source_id):
     except:
         raise Http404(f"Classification not found, {code}")
 
-def _serialize_search(search):
-    last_finished_category = search.categories.order_by('-modified').first()
+def _get_limit(request, default=MAX_LIMIT, maximum=MAX_LIMIT):
+    """Return page size requested by the `limit` query param, clamped to [1, maximum]."""
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        limit = default
+    return min(max(limit, 1), maximum)
+
+def _encode_cursor(values):
+    """Return opaque pagination cursor that encodes a list of JSON-serializable values."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def _decode_cursor(cursor):
+    """Return list of values encoded by `_encode_cursor()`; raise SuspiciousOperation (400) if the cursor is invalid."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise SuspiciousOperation(f"Invalid cursor, {cursor}")
+
+def _with_finished_at(searches):
+    """Return searches queryset annotated with `finished_at`, when the last category of each search was
+    updated, so that searches can be serialized without a query apiece (see `_serialize_search()`).
+    """
+    return searches.annotate(finished_at=Max('categories__modified'))
+
+def _serialize_search(search, all_categories=None):
+    """Return serialization of search.
+
+    Arguments:
+    search -- a Search object, ideally annotated by `_with_finished_at()`
+    all_categories -- (optional) a set of all category abbreviations; pass it in when serializing
+        many searches, to avoid looking it up for each search
+    """
+    if all_categories is None:
+        all_categories = set(ScopusClassification.all_categories())
+    if hasattr(search, 'finished_at'):
+        finished_at = search.finished_at
+    else:
+        finished_at = search.categories.aggregate(finished_at=Max('modified'))['finished_at']
     return {
         'id': search.id,
         'query': search.query,
         'categories': search.context[CATEGORIES],
-        'all_categories': set(search.context[CATEGORIES]) == set(ScopusClassification.all_categories()),
+        'all_categories': set(search.context[CATEGORIES]) == all_categories,
         'finished_categories': search.context[FINISHED_CATEGORIES],
+        'mode': search.mode,
         'finished': search.finished,
-        'finished_at': last_finished_category and last_finished_category.modified, # TODO: improve hack
+        'finished_at': finished_at,
         'created_at': search.created,
     }
 
@@ -322,19 +623,24 @@ def _serialize_job(job):
         'started_at': job.started_at,
     }
 
-def _serialize_search_job(job, search=None):
+def _serialize_search_job(job, search=None, all_categories=None):
     # If search object was not provided, try to locate unfinished search by job ID
     search = search or Search.objects.filter(finished=False, deleted=False).filter(job_id=job.id).first()
 
-    # If search object is available, return serialization
+    # If search object is available, return serialization; a search that is reused (see `_search()`)
+    # may not have a job
     if search:
-        search = _serialize_search(search)
-        search['job'] = _serialize_job(job)
+        search = _serialize_search(search, all_categories)
+        search['job'] = job and _serialize_job(job)
         return search
 
     return None
 
-def _serialize_search_jobs(jobs):
-    return list(
-        filter(lambda j: j, [_serialize_search_job(job) for job in jobs if job.func == get_search_results])
-    )
+def _serialize_search_jobs(jobs, all_categories=None):
+    # Locate the unfinished searches of all search jobs at once
+    jobs = [job for job in jobs if job.func == get_search_results]
+    searches = _with_finished_at(Search.objects.filter(finished=False, deleted=False, job_id__in=[job.id for job in jobs]))
+    searches = {search.job_id: search for search in searches}
+    return [
+        _serialize_search_job(job, searches[job.id], all_categories) for job in jobs if job.id in searches
+    ]
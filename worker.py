@@ -29,4 +29,7 @@ django.setup()
 
 if __name__ == '__main__':
     from project.worker import worker
+    from visualizer.catalog import load_catalog
+    # Load catalog before forking work horses so that each job inherits it rather than reloading it
+    load_catalog()
     worker()